@@ -0,0 +1,280 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from board import SIZE
+from lexicon import load_lexicon
+from scrabble_rules import Rejection, Scrabble
+
+POSITIONS_FILE = 'bench_positions.json'
+DICT_FILE = 'words.txt'
+# A benchmark is a regression when its median is this much slower
+THRESHOLD = 0.10
+
+
+def record_positions(path=POSITIONS_FILE, dict_file=DICT_FILE, seed=0):
+    """
+    Plays a greedy game from the seed and saves the moves leading to an
+    early, a mid and a late game board, with candidate moves for each and
+    dictionary words and non-words, so every run measures the same work.
+    """
+    rng = random.Random(seed)
+    lexicon = load_lexicon(dict_file)
+    game = Scrabble(2, lexicon, seed=seed, first_player=1)
+    moves = []
+    phases = {}
+    while len(phases) < 3:
+        generated = game.generate_moves()
+        if len(moves) == 2 and 'early' not in phases:
+            phases['early'] = _phase(game, moves, generated, rng)
+        elif len(moves) == 10 and 'mid' not in phases:
+            phases['mid'] = _phase(game, moves, generated, rng)
+        elif (not len(game._bag) or not generated) and 'late' not in phases:
+            phases['late'] = _phase(game, moves, generated, rng)
+            break
+        if generated:
+            moves.append(generated[0].tiles)
+            game.submit_turn(generated[0].tiles)
+        else:
+            moves.append(None)
+            game.advance_turn()
+
+    words = list(lexicon)
+    hits = rng.sample(words, 1000)
+    misses = []
+    while len(misses) < 1000:
+        word = rng.choice(words)
+        i = rng.randrange(len(word))
+        word = word[:i] + chr(rng.randrange(65, 91)) + word[i + 1:]
+        if word not in lexicon:
+            misses.append(word)
+
+    with open(path, 'w') as file:
+        json.dump({'seed': seed, 'phases': phases, 'hits': hits, 'misses': misses}, file)
+
+
+def _phase(game, moves, generated, rng):
+    """The moves so far and candidates for the board: legal and with an invalid word"""
+    valid = generated[:10] + rng.sample(generated[10:], min(20, len(generated[10:])))
+    invalid = []
+    for move in generated:
+        if len(invalid) == 20:
+            break
+        # The same rack tiles in another order usually spell a non-word
+        letters = [letter for _, _, letter in move.tiles]
+        letters = letters[1:] + letters[:1]
+        tiles = [(row, col, letter) for (row, col, _), letter in zip(move.tiles, letters)]
+        result = game.evaluate_move(tiles)
+        if result.reason == Rejection.INVALID_WORD:
+            invalid.append(tiles)
+    return {'moves': list(moves), 'valid': [move.tiles for move in valid], 'invalid': invalid}
+
+
+def replay(positions, phase, lexicon):
+    """A game at one of the recorded boards"""
+    game = Scrabble(2, lexicon, seed=positions['seed'], first_player=1)
+    for tiles in positions['phases'][phase]['moves']:
+        if tiles is None:
+            game.advance_turn()
+        elif not game.submit_turn(_tiles(tiles)):
+            raise ValueError(f"Recorded move {tiles} is not legal, re-record the positions")
+    return game
+
+
+def _tiles(tiles):
+    return [tuple(tile) for tile in tiles]
+
+
+def measure(function, rounds=5, number=1, setup=None):
+    """
+    Times rounds of number calls of function and returns seconds per call
+    as {'median', 'min', 'rounds', 'number'}. setup runs untimed before
+    every call when given. Garbage collection is off while timing, as in
+    timeit.
+    """
+    times = []
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            elapsed = 0.0
+            for _ in range(number):
+                if setup is not None:
+                    setup()
+                started = time.perf_counter()
+                function()
+                elapsed += time.perf_counter() - started
+            times.append(elapsed / number)
+    finally:
+        if collecting:
+            gc.enable()
+    return {'median': statistics.median(times), 'min': min(times),
+            'rounds': rounds, 'number': number}
+
+
+def bench_init(positions, lexicon):
+    return measure(lambda: Scrabble(2, DICT_FILE, seed=positions['seed']), rounds=5)
+
+
+def bench_valid_word_hits(positions, lexicon):
+    game = Scrabble(2, lexicon, seed=positions['seed'])
+    words = positions['hits']
+    return measure(lambda: [game._is_valid_word(word) for word in words], rounds=7)
+
+
+def bench_valid_word_misses(positions, lexicon):
+    game = Scrabble(2, lexicon, seed=positions['seed'])
+    words = positions['misses']
+    return measure(lambda: [game._is_valid_word(word) for word in words], rounds=7)
+
+
+def _bench_all_valid_words(phase):
+    def bench(positions, lexicon):
+        game = replay(positions, phase, lexicon)
+        candidates = positions['phases'][phase]
+        candidates = [_tiles(tiles) for tiles in candidates['valid'] + candidates['invalid']]
+        return measure(lambda: [game.all_valid_words(tiles) for tiles in candidates], rounds=7)
+    return bench
+
+
+def bench_submit_turn(positions, lexicon):
+    game = replay(positions, 'mid', lexicon)
+    snapshot = game.snapshot()
+    candidates = [_tiles(tiles) for tiles in positions['phases']['mid']['valid']]
+    moves = iter(candidates * 1000)
+    return measure(lambda: game.submit_turn(next(moves)), rounds=9, number=len(candidates),
+                   setup=lambda: game.restore(snapshot))
+
+
+def bench_render(positions, lexicon):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import pygame
+        import game as game_module
+    except ImportError as e:
+        return {'skipped': f"pygame is not available: {e}"}
+    pygame.init()
+    try:
+        screen = pygame.display.set_mode((800, 800))
+        game_module.dict_file = DICT_FILE
+        scene = game_module.GameScene(2)
+        scene.scrabble = replay(positions, 'mid', lexicon)
+        scene._update_player_tiles()
+        # Sprites for the tiles on the board, as _submit_turn leaves them
+        scene.game_tiles = []
+        for row in range(SIZE):
+            for col, letter in enumerate(scene.scrabble._board.line(row)):
+                if letter is None:
+                    continue
+                # The sprite sheet draws a played blank as a blank
+                tile = game_module.Tile(' ' if letter.isupper() else letter, scene.letter_ss,
+                                        game_module.tile_to_pixel(row, col))
+                tile.on_board, tile.board_x, tile.board_y = True, row, col
+                scene.game_tiles.append(tile)
+        return measure(lambda: scene.render(screen), rounds=5, number=20)
+    finally:
+        pygame.quit()
+
+
+BENCHMARKS = {
+    'init': bench_init,
+    'is_valid_word_hits': bench_valid_word_hits,
+    'is_valid_word_misses': bench_valid_word_misses,
+    'all_valid_words_early': _bench_all_valid_words('early'),
+    'all_valid_words_mid': _bench_all_valid_words('mid'),
+    'all_valid_words_late': _bench_all_valid_words('late'),
+    'submit_turn': bench_submit_turn,
+    'render': bench_render,
+}
+
+
+def run(names=None, positions_file=POSITIONS_FILE, dict_file=DICT_FILE):
+    """Runs the benchmarks (all by default) and returns the results"""
+    with open(positions_file) as file:
+        positions = json.load(file)
+    lexicon = load_lexicon(dict_file)
+    results = {}
+    for name, benchmark in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = benchmark(positions, lexicon)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'benchmarks': results,
+    }
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Pairs up the medians of two runs. Returns rows of (name, baseline,
+    current, ratio, regressed), regressed when current is more than
+    threshold slower.
+    """
+    rows = []
+    for name, result in current['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if not before or 'median' not in before or 'median' not in result:
+            continue
+        ratio = result['median'] / before['median']
+        rows.append((name, before['median'], result['median'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrabble benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('names', nargs='*', help='benchmarks to run: %s' % ', '.join(BENCHMARKS))
+    run_parser.add_argument('-o', '--output', help='file for the JSON results (default: stdout)')
+    run_parser.add_argument('-b', '--baseline', help='JSON results to compare against')
+    run_parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD)
+    compare_parser = commands.add_parser('compare', help='compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD)
+    record_parser = commands.add_parser('record', help='record the benchmark positions')
+    record_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        record_positions(seed=args.seed)
+        print(f"Recorded positions in {POSITIONS_FILE}")
+        return 0
+
+    if args.command == 'run':
+        current = run(args.names)
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(current, file, indent=2)
+        else:
+            json.dump(current, sys.stdout, indent=2)
+            print()
+        if not args.baseline:
+            return 0
+        baseline_file = args.baseline
+    else:
+        with open(args.current) as file:
+            current = json.load(file)
+        baseline_file = args.baseline
+
+    with open(baseline_file) as file:
+        baseline = json.load(file)
+    regressions = 0
+    for name, before, after, ratio, regressed in compare(baseline, current, args.threshold):
+        regressions += regressed
+        flag = 'REGRESSION' if regressed else ''
+        print(f"{name:24} {before * 1000:10.3f} ms {after * 1000:10.3f} ms {ratio:6.2f}x {flag}",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+SIZE = 15
+FULL_LINE = (1 << SIZE) - 1
+EMPTY = 0
+BLANK = 27
+# A blank played as a letter keeps the letter's code with this bit set
+BLANK_LETTER = 32
+
+# Letter codes: 'a'-'z' are 1-26, an unassigned blank ' ' is 27 and a blank
+# played as 'A'-'Z' is 33-58
+CODES = {chr(97 + i): i + 1 for i in range(26)}
+CODES.update({chr(65 + i): (i + 1) | BLANK_LETTER for i in range(26)})
+CODES[' '] = BLANK
+LETTERS = [None] * 64
+for _letter, _code in CODES.items():
+    LETTERS[_code] = _letter
+
+
+class Board:
+    """
+    The 15x15 board as a bytearray of letter codes (0 for an empty square),
+    with occupancy bitboards for every row and column.
+
+    Bit c of rows[r] and bit r of cols[c] are set when (r, c) holds a tile.
+    Line helpers take a vertical flag and read a column as if it were a
+    row, so horizontal and vertical words go through the same code.
+    """
+    def __init__(self):
+        """Creates an empty board"""
+        self.cells = bytearray(SIZE * SIZE)
+        self.rows = [0] * SIZE
+        self.cols = [0] * SIZE
+
+    @classmethod
+    def from_cells(cls, cells):
+        """A board holding the letter codes of a 225 byte snapshot"""
+        board = cls.__new__(cls)
+        board.cells = bytearray(cells)
+        board.rows = [0] * SIZE
+        board.cols = [0] * SIZE
+        for square, code in enumerate(board.cells):
+            if code:
+                row, col = divmod(square, SIZE)
+                board.rows[row] |= 1 << col
+                board.cols[col] |= 1 << row
+        return board
+
+    def overlay(self, tiles):
+        """A copy of the letter codes with the (row, col, letter) tiles written in"""
+        cells = bytearray(self.cells)
+        for row, col, letter in tiles:
+            cells[row * SIZE + col] = CODES[letter]
+        return cells
+
+    def get(self, row, col):
+        """The letter on the square, or None if it is empty"""
+        return LETTERS[self.cells[row * SIZE + col]]
+
+    def place(self, row, col, letter):
+        """Puts a tile on the square"""
+        self.cells[row * SIZE + col] = CODES[letter]
+        self.rows[row] |= 1 << col
+        self.cols[col] |= 1 << row
+
+    def remove(self, row, col):
+        """Takes the tile off the square"""
+        self.cells[row * SIZE + col] = EMPTY
+        self.rows[row] &= ~(1 << col)
+        self.cols[col] &= ~(1 << row)
+
+    def is_empty(self):
+        """True if no tile has been placed"""
+        return not any(self.rows)
+
+    def occupancy(self, index, vertical=False):
+        """Bitboard of row index, or column index if vertical"""
+        return self.cols[index] if vertical else self.rows[index]
+
+    def line(self, index, vertical=False):
+        """The letters of row index, or column index if vertical, None when empty"""
+        cells = self.cells
+        if vertical:
+            return [LETTERS[code] for code in cells[index:SIZE * SIZE:SIZE]]
+        return [LETTERS[code] for code in cells[index * SIZE:index * SIZE + SIZE]]
+
+    def span(self, index, vertical, mask):
+        """
+        Returns (start, end) of the run of tiles in a line that contains the
+        lowest square of mask, treating the squares in mask as occupied.
+        """
+        occupied = self.occupancy(index, vertical) | mask
+        pos = (mask & -mask).bit_length() - 1
+        start = (~occupied & ((1 << pos) - 1)).bit_length()
+        empty_after = ~occupied >> pos
+        end = pos + (empty_after & -empty_after).bit_length() - 2
+        return start, end
+
+    def is_filled(self, index, vertical, mask, start, end):
+        """True if every square of the line from start to end is occupied or in mask"""
+        squares = ((1 << (end + 1)) - 1) & ~((1 << start) - 1)
+        return (self.occupancy(index, vertical) | mask) & squares == squares
+
+    def neighbours(self, row):
+        """Bitboard of the squares in the row orthogonally next to a tile"""
+        rows = self.rows
+        mask = rows[row] << 1 | rows[row] >> 1
+        if row > 0:
+            mask |= rows[row - 1]
+        if row < SIZE - 1:
+            mask |= rows[row + 1]
+        return mask & FULL_LINE
+
+    def has_neighbour(self, row, col):
+        """True if a tile is orthogonally next to the square"""
+        return bool(self.neighbours(row) >> col & 1)
+
+    def anchors(self):
+        """(row, col) of every empty square next to a tile"""
+        anchors = []
+        for row in range(SIZE):
+            mask = self.neighbours(row) & ~self.rows[row]
+            while mask:
+                low = mask & -mask
+                anchors.append((row, low.bit_length() - 1))
+                mask ^= low
+        return anchors
@@ -1,13 +1,11 @@
+import logging
 import pygame
 import sys
 from constants import PLAYER_TILE_POSITIONS, LETTERS
 from image import LetterParser
 from scrabble_rules import Scrabble
 
-if len(sys.argv) < 2:
-    print("Usage: game.py <dict_file>")
-    sys.exit(1)
-dict_file = sys.argv[1]
+dict_file = 'words.txt'
 
 
 class SceneBase:
@@ -356,4 +354,11 @@ class GameScene(SceneBase):
 
 
 
-run_game(800, 800, 60, TitleScene())
\ No newline at end of file
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: game.py <dict_file>")
+        sys.exit(1)
+    dict_file = sys.argv[1]
+    # The rules log each turn, show it on the console as before
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    run_game(800, 800, 60, TitleScene())
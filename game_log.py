@@ -0,0 +1,95 @@
+import json
+import logging
+from logging.handlers import BufferingHandler
+
+
+def event(name, **fields):
+    """
+    The extra= of a log call for a structured event, which JsonLinesHandler
+    writes out as separate fields.
+    """
+    return {'event': name, 'fields': fields}
+
+
+class JsonLinesHandler(BufferingHandler):
+    """
+    Writes log records to a file or stream as one JSON object per line,
+    batch_size records at a time and whenever it is flushed or closed.
+    Each record is formatted as it arrives, so a batch shows the state
+    its arguments had when they were logged.
+    """
+    def __init__(self, target, batch_size=100):
+        """target is a path, opened for appending, or a text stream"""
+        super().__init__(batch_size)
+        if isinstance(target, str):
+            self.stream = open(target, 'a')
+            self._owns_stream = True
+        else:
+            self.stream = target
+            self._owns_stream = False
+        # The logger and level log_to_json_lines changed, put back on close
+        self._logger = None
+        self._previous_level = logging.NOTSET
+
+    def record_dict(self, record):
+        """The JSON object of a record"""
+        data = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', {}))
+        return data
+
+    def emit(self, record):
+        """Buffers the JSON line of the record, writing the batch when it is full"""
+        try:
+            line = json.dumps(self.record_dict(record), default=str)
+        except Exception:
+            self.handleError(record)
+            return
+        self.buffer.append(line)
+        if self.shouldFlush(record):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                self.stream.write('\n'.join(self.buffer) + '\n')
+                self.stream.flush()
+                self.buffer.clear()
+        finally:
+            self.release()
+
+    def close(self):
+        """Writes what is buffered and detaches from the logger log_to_json_lines attached it to"""
+        if self._logger is not None:
+            self._logger.removeHandler(self)
+            self._logger.setLevel(self._previous_level)
+            self._logger = None
+        try:
+            self.flush()
+            if self._owns_stream:
+                self.stream.close()
+        finally:
+            super().close()
+
+
+def log_to_json_lines(target, level=logging.INFO, logger='', batch_size=100):
+    """
+    Sends the records of a logger (the root logger by default) at level or
+    above to a new JsonLinesHandler, which is returned so it can be closed.
+    Closing it removes it and gives the logger back its level, so events
+    cost nothing again once the sink is gone.
+    """
+    handler = JsonLinesHandler(target, batch_size)
+    log = logging.getLogger(logger)
+    log.addHandler(handler)
+    handler._logger = log
+    handler._previous_level = log.level
+    if log.level == logging.NOTSET or log.level > level:
+        log.setLevel(level)
+    return handler
@@ -0,0 +1,142 @@
+import argparse
+import gc
+import sys
+import types
+from array import array
+
+from lexicon import Lexicon, load_lexicon
+from scrabble_rules import _RNG_VERSION, GameSnapshot, Scrabble
+from tile_bag import TILES, TileBag
+
+_INDEX = {tile: i for i, tile in enumerate(TILES)}
+
+
+class GameState:
+    """
+    The whole state of a Scrabble game in a few flat buffers, for keeping
+    many idle games in memory.
+
+    cells is the 225 byte board of Board, racks holds the count of each
+    tile for every player in turn (27 bytes each, tiles in TILES order), bag
+    the counts of the tiles left, scores an array('i') and eliminated a
+    byte per player. rng is the bag's Mersenne Twister state as 625 words,
+    which is most of the size but keeps the draws exactly as they were, and
+    is left empty once the bag is. Rack order is not kept, racks come back
+    in tile order.
+    """
+    __slots__ = ('cells', 'racks', 'bag', 'scores', 'eliminated', 'rng',
+                 'current_player', 'move_count')
+
+    def __init__(self, cells, racks, bag, scores, eliminated, rng, current_player, move_count):
+        self.cells = cells
+        self.racks = racks
+        self.bag = bag
+        self.scores = scores
+        self.eliminated = eliminated
+        self.rng = rng
+        self.current_player = current_player
+        self.move_count = move_count
+
+    @classmethod
+    def from_snapshot(cls, snapshot, eliminated=None):
+        """The state of a GameSnapshot, with no player eliminated by default"""
+        players = len(snapshot.racks)
+        racks = bytearray(players * len(TILES))
+        for i, rack in enumerate(snapshot.racks):
+            for tile in rack:
+                racks[i * len(TILES) + _INDEX[tile]] += 1
+        bag = bytearray(snapshot.bag.count(tile) for tile in TILES)
+        rng = array('I')
+        if len(snapshot.bag):
+            version, words, gauss = snapshot.bag.getstate()
+            if version != _RNG_VERSION or gauss is not None:
+                raise ValueError("The bag's random state cannot be stored")
+            rng.extend(words)
+        return cls(bytearray(snapshot.cells), racks, bag, array('i', snapshot.scores),
+                   bytearray(eliminated or players), rng,
+                   snapshot.current_player, snapshot.move_count)
+
+    @classmethod
+    def from_game(cls, game):
+        """The state of a Scrabble game"""
+        return cls.from_snapshot(game.snapshot(), game.eliminated)
+
+    @property
+    def max_players(self):
+        return len(self.scores)
+
+    def rack(self, player):
+        """The tiles of the player's rack, in tile order"""
+        start = (player - 1) * len(TILES)
+        counts = self.racks[start:start + len(TILES)]
+        return [tile for tile, count in zip(TILES, counts) for _ in range(count)]
+
+    def snapshot(self):
+        """The GameSnapshot that Scrabble.restore returns a game to"""
+        bag = TileBag(dict(zip(TILES, self.bag)))
+        if self.rng:
+            bag.setstate((_RNG_VERSION, tuple(self.rng), None))
+        racks = tuple(tuple(self.rack(player)) for player in range(1, self.max_players + 1))
+        return GameSnapshot(bytes(self.cells), racks, bag, tuple(self.scores), self.move_count,
+                            self.current_player)
+
+    def to_game(self, dict_file='words.txt'):
+        """
+        A Scrabble game in this state. dict_file is a word list or a
+        Lexicon, as for Scrabble. The cross-checks are built on the game's
+        first generate_moves or apply, see Scrabble.from_snapshot.
+        """
+        return Scrabble.from_snapshot(self.snapshot(), self.eliminated, dict_file)
+
+    def nbytes(self):
+        """Bytes taken by the state and its buffers"""
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, name))
+                                         for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+def memory_size(obj, shared=()):
+    """
+    Bytes taken by an object and everything it refers to, leaving out
+    classes, modules, functions, lexicons and the objects in shared, which
+    are not owned by any one game.
+    """
+    seen = {id(item) for item in shared}
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, types.ModuleType, types.FunctionType,
+                                                 Lexicon)):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memory of a game, live and as a GameState')
+    parser.add_argument('-d', '--dict-file', default='words.txt')
+    parser.add_argument('-m', '--moves', type=int, default=10, help='greedy moves to play first')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    game = Scrabble(2, load_lexicon(args.dict_file), seed=args.seed, first_player=1)
+    for _ in range(args.moves):
+        moves = game.generate_moves()
+        if not moves:
+            break
+        game.submit_turn(moves[0].tiles)
+    state = GameState.from_game(game)
+    live = memory_size(game)
+    print(f"Scrabble:  {live:7} bytes")
+    print(f"GameState: {state.nbytes():7} bytes ({live / state.nbytes():.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    main()
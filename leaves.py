@@ -0,0 +1,283 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from board import CODES
+from constants import LETTERS_FREQS
+from scoring import RACK_SIZE
+
+# Next to this module, wherever the program is run from
+LEAVES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leaves.bin')
+LEAVES_VERSION = 1
+_LEAVES_MAGIC = b'SCRBLEAV'
+_BIG_ENDIAN = 1
+# magic, format version, flags, number of leaves
+_LEAVES_HEADER = struct.Struct('<8sHHI')
+
+# Rack tiles in key order, ' ' (the blank) last
+_TILES = sorted(LETTERS_FREQS, key=CODES.__getitem__)
+# Leaves are keyed by their tile codes in ascending order, base 28: six
+# codes of at most 27 fit in 32 bits
+_KEY_BASE = 28
+MAX_LEAVE = RACK_SIZE - 1
+
+# Samples needed before a leave's own average counts as much as the model
+SHRINK = 20
+# Ridge penalty that keeps rarely seen tiles near zero
+RIDGE = 1.0
+
+
+def leave_of(rack, tiles):
+    """The rack tiles kept after playing tiles, a blank played as a letter uses ' '"""
+    leave = list(rack)
+    for _, _, letter in tiles:
+        leave.remove(' ' if letter.isupper() else letter)
+    return leave
+
+
+def leave_key(leave):
+    """The table key of a leave, the same for any order of its tiles"""
+    key = 0
+    for code in sorted(CODES[tile] for tile in leave):
+        key = key * _KEY_BASE + code
+    return key
+
+
+class LeaveTable:
+    """
+    Value of every rack leave of up to six tiles: the points a kept set of
+    tiles is worth on later turns compared to drawing a fresh rack.
+
+    The table is a sorted array of leave keys with a parallel array of
+    values, saved as one file that is memory mapped and searched in place.
+    """
+    def __init__(self, keys, values, buffer=None):
+        """Use sorted keys and their values, both arrays or memoryviews"""
+        self._keys = keys
+        self._values = values
+        self._buffer = buffer
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Use a saved table image in place"""
+        if len(buffer) < _LEAVES_HEADER.size:
+            raise ValueError('Not a leave table')
+        magic, version, flags, count = _LEAVES_HEADER.unpack_from(buffer)
+        if magic != _LEAVES_MAGIC or version != LEAVES_VERSION:
+            raise ValueError('Not a leave table')
+        if len(buffer) < _LEAVES_HEADER.size + 8 * count:
+            raise ValueError('Truncated leave table')
+        start = _LEAVES_HEADER.size
+        view = memoryview(buffer)
+        keys = view[start:start + 4 * count].cast('I')
+        values = view[start + 4 * count:start + 8 * count].cast('f')
+        if bool(flags & _BIG_ENDIAN) != (sys.byteorder == 'big'):
+            keys = array('I', keys)
+            keys.byteswap()
+            values = array('f', values)
+            values.byteswap()
+        return cls(keys, values, buffer)
+
+    @classmethod
+    def load(cls, path=LEAVES_FILE):
+        """Memory map a saved table"""
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(buffer)
+
+    def to_bytes(self):
+        """The saved image of the table"""
+        flags = _BIG_ENDIAN if sys.byteorder == 'big' else 0
+        header = _LEAVES_HEADER.pack(_LEAVES_MAGIC, LEAVES_VERSION, flags, len(self._keys))
+        return header + array('I', self._keys).tobytes() + array('f', self._values).tobytes()
+
+    def save(self, path=LEAVES_FILE):
+        """Write the table to a file"""
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, leave):
+        """Value of the leave, 0 for an empty or full rack"""
+        key = leave_key(leave)
+        keys = self._keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return self._values[i]
+        return 0.0
+
+    def value(self, rack, tiles):
+        """Value of what is left of the rack after playing tiles"""
+        return self[leave_of(rack, tiles)]
+
+
+_default_table = None
+
+
+def default_table():
+    """
+    The table in LEAVES_FILE, loaded once per process. Raises
+    FileNotFoundError saying how to fit one if there is none.
+    """
+    global _default_table
+    if _default_table is None:
+        if not os.path.exists(LEAVES_FILE):
+            raise FileNotFoundError(
+                f"No leave table at {LEAVES_FILE}, fit one with `python leaves.py RECORDS` "
+                f"from the games of `python simulate.py -o RECORDS`")
+        _default_table = LeaveTable.load(LEAVES_FILE)
+    return _default_table
+
+
+def equity(game, moves, rng):
+    """Plays the move with the best score plus value of the tiles kept"""
+    if not moves:
+        return None
+    table = default_table()
+    rack = game.get_rack(game.current_player)
+    return max(moves, key=lambda move: move.score + table.value(rack, move.tiles))
+
+
+def samples(records):
+    """
+    Yields (leave, points) from self-play game records: the tiles a player
+    kept after a move and what they scored on their next turn. Only moves
+    followed by a full draw from the bag count.
+    """
+    for record in records:
+        turns = record['turns']
+        for i, turn in enumerate(turns):
+            if 'tiles' not in turn or turn['bag'] < len(turn['tiles']):
+                continue
+            for later in turns[i + 1:]:
+                if later['player'] == turn['player']:
+                    yield leave_of(turn['rack'], turn['tiles']), later['score']
+                    break
+
+
+def fit(samples, shrink=SHRINK, ridge=RIDGE):
+    """
+    Builds a LeaveTable from (leave, points) samples.
+
+    A ridge regression on one feature per tile and copy of it (the first E,
+    the second E, ...) gives every leave a value, so duplicates can cost
+    more than the tile alone. Leaves seen often enough then add their own
+    average error, shrunk towards zero by shrink samples.
+    """
+    features = {}
+    for tile in _TILES:
+        for copy in range(min(LETTERS_FREQS[tile], MAX_LEAVE)):
+            features[tile, copy] = len(features) + 1
+    size = len(features) + 1
+
+    # Count and total points of each distinct leave
+    seen = {}
+    for leave, points in samples:
+        if len(leave) > MAX_LEAVE:
+            continue
+        key = leave_key(leave)
+        if key in seen:
+            seen[key][1] += 1
+            seen[key][2] += points
+        else:
+            seen[key] = [_active(leave, features), 1, points]
+
+    # Normal equations, column 0 is the intercept: a fresh rack
+    matrix = [[0.0] * size for _ in range(size)]
+    vector = [0.0] * size
+    for active, count, total in seen.values():
+        columns = [0] + active
+        for a in columns:
+            vector[a] += total
+            row = matrix[a]
+            for b in columns:
+                row[b] += count
+    for i in range(1, size):
+        matrix[i][i] += ridge
+    weights = _solve(matrix, vector)
+
+    residuals = {}
+    for key, (active, count, total) in seen.items():
+        predicted = weights[0] + sum(weights[a] for a in active)
+        residuals[key] = (total - predicted * count) / (count + shrink)
+
+    entries = []
+
+    def add(key, length, value, first):
+        for i in range(first, len(_TILES)):
+            tile = _TILES[i]
+            next_value = value
+            next_key = key
+            for copy in range(min(LETTERS_FREQS[tile], MAX_LEAVE - length)):
+                next_value += weights[features[tile, copy]]
+                next_key = next_key * _KEY_BASE + CODES[tile]
+                entries.append((next_key, next_value + residuals.get(next_key, 0.0)))
+                add(next_key, length + copy + 1, next_value, i + 1)
+
+    add(0, 0, 0.0, 0)
+    entries.sort()
+    return LeaveTable(array('I', [key for key, _ in entries]),
+                      array('f', [value for _, value in entries]))
+
+
+def _active(leave, features):
+    """Feature columns of a leave"""
+    copies = {}
+    active = []
+    for tile in leave:
+        copy = copies.get(tile, 0)
+        copies[tile] = copy + 1
+        active.append(features[tile, copy])
+    return active
+
+
+def _solve(matrix, vector):
+    """Solves a symmetric positive definite system by Gaussian elimination"""
+    size = len(vector)
+    for i in range(size):
+        pivot = matrix[i][i]
+        for j in range(i + 1, size):
+            factor = matrix[j][i] / pivot
+            if factor:
+                row, pivot_row = matrix[j], matrix[i]
+                for k in range(i, size):
+                    row[k] -= factor * pivot_row[k]
+                vector[j] -= factor * vector[i]
+    solution = [0.0] * size
+    for i in reversed(range(size)):
+        total = vector[i] - sum(matrix[i][k] * solution[k] for k in range(i + 1, size))
+        solution[i] = total / matrix[i][i]
+    return solution
+
+
+def read_records(paths):
+    """Yields the game records of JSON lines files written by simulate.py"""
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Fit rack leave values to self-play games from simulate.py -o')
+    parser.add_argument('records', nargs='+', help='JSON lines game records')
+    parser.add_argument('-o', '--output', default=LEAVES_FILE)
+    parser.add_argument('--shrink', type=float, default=SHRINK)
+    args = parser.parse_args(argv)
+
+    table = fit(samples(read_records(args.records)), args.shrink)
+    table.save(args.output)
+    print(f"Saved {len(table)} leave values to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
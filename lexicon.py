@@ -0,0 +1,631 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+
+INDEX_SUFFIX = '.idx'
+_INDEX_MAGIC = b'SCRBIDX1'
+# magic, source size, source mtime (ns), number of words
+_INDEX_HEADER = struct.Struct('<8sQqQ')
+
+COMPILED_SUFFIX = '.dawg'
+COMPILED_VERSION = 1
+_COMPILED_MAGIC = b'SCRBDAWG'
+_BIG_ENDIAN = 1
+# magic, format version, flags, number of words, number of edges,
+# sha256 of the source word list
+_COMPILED_HEADER = struct.Struct('<8sHHII32s')
+# Nodes whose edges Lexicon.children keeps, about 300 bytes each. Every
+# process has its own cache, even of a shared lexicon, so it is kept far
+# smaller than the whole DAWG, which a few hundred games fill
+CHILDREN_CACHE_SIZE = 10000
+
+
+class WordFile:
+    """
+    A sorted, newline separated word list searched directly on disk.
+
+    The byte offset of every line is kept in an array so each probe of the
+    binary search is a single slice of the memory mapped file.
+    """
+    def __init__(self, path, save_index=True):
+        """Map the word list and load or build its line offset index"""
+        self.path = path
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        if self._size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b''
+        self._offsets = self._load_index()
+        if self._offsets is None:
+            self._offsets = self._build_index()
+            if save_index:
+                self._save_index()
+
+    def __len__(self):
+        """Number of words in the list"""
+        return len(self._offsets) - 1
+
+    def __contains__(self, word):
+        """Binary search for the word, one slice per probe"""
+        word = word.upper().encode('ascii', 'replace')
+        offsets = self._offsets
+        low, high = 0, len(offsets) - 2
+        while low <= high:
+            mid = (low + high) // 2
+            line = self._map[offsets[mid]:offsets[mid + 1]].strip().upper()
+            if line == word:
+                return True
+            elif line < word:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return False
+
+    def __iter__(self):
+        """Iterate over the words in file order"""
+        for i in range(len(self)):
+            yield self.word_at(i)
+
+    def word_at(self, line_num):
+        """Returns the word on the given line"""
+        start, end = self._offsets[line_num], self._offsets[line_num + 1]
+        return self._map[start:end].strip().decode('ascii')
+
+    def close(self):
+        """Release the mapping and the file handle"""
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _build_index(self):
+        """
+        Scans the file once and returns the start offset of every line,
+        followed by the file size as a sentinel.
+        """
+        offsets = array('Q')
+        data = self._map
+        pos = 0
+        while pos < self._size:
+            offsets.append(pos)
+            pos = data.find(b'\n', pos)
+            if pos == -1:
+                break
+            pos += 1
+        offsets.append(self._size)
+        return offsets
+
+    def _index_path(self):
+        return self.path + INDEX_SUFFIX
+
+    def _source_stamp(self):
+        stat = os.fstat(self._file.fileno())
+        return stat.st_size, stat.st_mtime_ns
+
+    def _load_index(self):
+        """
+        Returns the saved offsets if the index file matches the current
+        word list, otherwise None.
+        """
+        try:
+            with open(self._index_path(), 'rb') as file:
+                header = file.read(_INDEX_HEADER.size)
+                if len(header) != _INDEX_HEADER.size:
+                    return None
+                magic, size, mtime, count = _INDEX_HEADER.unpack(header)
+                if magic != _INDEX_MAGIC or (size, mtime) != self._source_stamp():
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(file.read())
+        except (OSError, ValueError):
+            return None
+
+        if len(offsets) != count + 1:
+            return None
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return offsets
+
+    def _save_index(self):
+        """Writes the offsets next to the word list, if the directory allows it"""
+        offsets = self._offsets
+        if sys.byteorder == 'big':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        size, mtime = self._source_stamp()
+        try:
+            with open(self._index_path(), 'wb') as file:
+                file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, size, mtime, len(self)))
+                file.write(offsets.tobytes())
+        except OSError:
+            # A read-only deploy just rebuilds the index on every start
+            pass
+
+
+# Each edge of the flattened DAWG is packed into one unsigned 32 bit int:
+# bits 0-4 hold the letter (0 = 'A'), bit 5 marks that the path ending on
+# this edge is a word, bit 6 marks the last edge of its node and the
+# remaining bits hold the index of the child node's first edge (0 if the
+# child has no edges).
+_LETTER_MASK = 0x1F
+_END_OF_WORD = 0x20
+_LAST_EDGE = 0x40
+_CHILD_SHIFT = 7
+
+
+class _BuildNode:
+    """A node of the DAWG while it is being built and minimized"""
+    __slots__ = ('id', 'final', 'edges')
+
+    def __init__(self, node_id):
+        self.id = node_id
+        self.final = False
+        self.edges = {}
+
+    def key(self):
+        """Nodes with the same key accept the same suffixes"""
+        return self.final, tuple((letter, child.id) for letter, child in sorted(self.edges.items()))
+
+
+class Lexicon:
+    """
+    An in-memory word list stored as a minimized DAWG.
+
+    The automaton is a flat array of packed edges, so a single Lexicon can be
+    shared by any number of games and every lookup is a walk in memory.
+    Words are upper case A-Z; lookups are case insensitive.
+    """
+    def __init__(self, words=()):
+        """Build the DAWG from an iterable of words"""
+        edges, count = self._build(words)
+        self._attach(edges, count)
+
+    def _attach(self, edges, count, buffer=None):
+        self._edges = edges
+        self._count = count
+        # Keeps a mapped file or shared buffer alive as long as the edges
+        self._buffer = buffer
+        self._children = {}
+        self.root = 1 if len(edges) > 1 else 0
+
+    @classmethod
+    def from_file(cls, path):
+        """Build a Lexicon from a newline separated word list"""
+        with open(path, 'r') as file:
+            return cls(line.strip() for line in file)
+
+    @classmethod
+    def from_buffer(cls, buffer, digest=None):
+        """
+        Use a compiled lexicon image in place, without copying the edges.
+        If digest is given, returns None unless the image was compiled from
+        a source list with that sha256 digest.
+        """
+        header = _read_compiled_header(buffer)
+        if header is None:
+            raise ValueError('Not a compiled lexicon')
+        flags, count, num_edges, source_digest = header
+        if digest is not None and digest != source_digest:
+            return None
+        start = _COMPILED_HEADER.size
+        edges = memoryview(buffer)[start:start + 4 * num_edges].cast('I')
+        if bool(flags & _BIG_ENDIAN) != (sys.byteorder == 'big'):
+            edges = array('I', edges)
+            edges.byteswap()
+        lexicon = cls.__new__(cls)
+        lexicon._attach(edges, count, buffer)
+        return lexicon
+
+    @classmethod
+    def load(cls, path, digest=None):
+        """Memory map a compiled lexicon file, see from_buffer"""
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(buffer, digest)
+
+    @classmethod
+    def load_compiled(cls, path):
+        """
+        Returns the compiled Lexicon for a word list, or None if it has not
+        been compiled or the list changed since.
+        The path may also name a compiled file directly.
+        """
+        try:
+            with open(path, 'rb') as file:
+                if file.read(len(_COMPILED_MAGIC)) == _COMPILED_MAGIC:
+                    return cls.load(path)
+            return cls.load(path + COMPILED_SUFFIX, source_digest(path))
+        except (OSError, ValueError):
+            return None
+
+    def share(self, name=None):
+        """
+        Copies the compiled image into a new shared memory segment that other
+        processes can attach to with Lexicon.attach(segment.name).
+        The caller owns the segment and must close() and unlink() it.
+        """
+        image = self.to_bytes()
+        segment = shared_memory.SharedMemory(name=name, create=True, size=len(image))
+        segment.buf[:len(image)] = image
+        return segment
+
+    @classmethod
+    def attach(cls, name, shared_tracker=False):
+        """
+        Uses a lexicon shared with Lexicon.share in place, read-only and
+        without loading or copying it into this process.
+        shared_tracker is for the process that owns the segment and the
+        processes it started, such as pool workers, which share its
+        resource tracker.
+        """
+        try:
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the segment with the
+            # resource tracker, which unlinks it when it shuts down. A
+            # tracker shared with the owner must keep it for the owner's
+            # unlink, only a tracker of our own must forget it.
+            segment = shared_memory.SharedMemory(name=name)
+            if not shared_tracker:
+                resource_tracker.unregister(segment._name, 'shared_memory')
+        lexicon = cls.from_buffer(segment.buf)
+        lexicon._buffer = segment
+        return lexicon
+
+    def to_bytes(self, digest=bytes(32)):
+        """The compiled image of the lexicon, tagged with the source digest"""
+        edges = array('I', self._edges)
+        flags = _BIG_ENDIAN if sys.byteorder == 'big' else 0
+        header = _COMPILED_HEADER.pack(_COMPILED_MAGIC, COMPILED_VERSION, flags,
+                                       self._count, len(edges), digest)
+        return header + edges.tobytes()
+
+    def save(self, path, digest=bytes(32)):
+        """Write the compiled image to a file"""
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes(digest))
+
+    def __len__(self):
+        """Number of words in the lexicon"""
+        return self._count
+
+    def __contains__(self, word):
+        return self.contains(word)
+
+    def __iter__(self):
+        """Iterate over all words in alphabetical order"""
+        return self._words_from(self.root, '')
+
+    def contains(self, word):
+        """True if the word is in the lexicon"""
+        return self.walk(word)[1]
+
+    def has_prefix(self, prefix):
+        """True if at least one word starts with the prefix"""
+        if not prefix:
+            return self._count > 0
+        node, is_word = self.walk(prefix)
+        return node is not None and (node != 0 or is_word)
+
+    def words_with_prefix(self, prefix):
+        """Iterate over all words starting with the prefix, in order"""
+        prefix = prefix.upper()
+        node, is_word = self.walk(prefix)
+        if node is None:
+            return
+        if is_word and prefix:
+            yield prefix
+        yield from self._words_from(node, prefix)
+
+    def query(self, pattern, min_length=1, max_length=None):
+        """
+        Yields every word matching a crossword style pattern, in order.
+
+        The pattern is a string where a letter matches itself, '?' any
+        letter, '[ABC]' one of a set, '[^ABC]' anything outside it and '*'
+        any run of letters, e.g. '?A??E', 'RE*' or '[AEIOU]*ING'. It can
+        also be a sequence with one constraint per position: a set or string
+        of allowed letters, a 26 bit mask such as a cross-check, None for any
+        letter or '*'.
+
+        The pattern runs as an automaton alongside a walk of the DAWG, so
+        only branches that can still match are visited.
+        """
+        tokens = _parse_pattern(pattern)
+        stars = 0
+        for i, token in enumerate(tokens):
+            if token is _STAR:
+                stars |= 1 << i
+        accept = 1 << len(tokens)
+
+        def closure(states):
+            # A star may also match nothing
+            while states & stars & ~(states >> 1):
+                states |= (states & stars) << 1
+            return states
+
+        def walk(node, prefix, states):
+            for letter, is_word, child in self.children(node):
+                bit = 1 << (ord(letter) - 65)
+                next_states = 0
+                remaining = states
+                while remaining:
+                    low = remaining & -remaining
+                    i = low.bit_length() - 1
+                    remaining ^= low
+                    if low == accept:
+                        continue
+                    token = tokens[i]
+                    if token is _STAR:
+                        next_states |= low
+                    elif token & bit:
+                        next_states |= low << 1
+                if not next_states:
+                    continue
+                next_states = closure(next_states)
+                word = prefix + letter
+                if (is_word and next_states & accept and len(word) >= min_length and
+                        (max_length is None or len(word) <= max_length)):
+                    yield word
+                if child and (max_length is None or len(word) < max_length):
+                    yield from walk(child, word, next_states)
+
+        return walk(self.root, '', closure(1))
+
+    def edges(self, node):
+        """
+        Yields (letter, is_word, child) for each edge leaving the node.
+        Letters are upper case, child is 0 if no word continues past it.
+        """
+        if not node:
+            return
+        edges = self._edges
+        while True:
+            edge = edges[node]
+            yield chr(65 + (edge & _LETTER_MASK)), bool(edge & _END_OF_WORD), edge >> _CHILD_SHIFT
+            if edge & _LAST_EDGE:
+                return
+            node += 1
+
+    def children(self, node):
+        """
+        The edges of a node as a tuple of (letter, is_word, child), cached
+        for walks that visit the same nodes over and over, see
+        CHILDREN_CACHE_SIZE.
+        """
+        children = self._children.get(node)
+        if children is None:
+            if len(self._children) >= CHILDREN_CACHE_SIZE:
+                self._children.clear()
+            children = self._children[node] = tuple(self.edges(node))
+        return children
+
+    def step(self, node, letter):
+        """
+        Follows the edge for the letter out of the node.
+        Returns (child, is_word), or (None, False) if there is no such edge.
+        """
+        code = ord(letter) - 65
+        if not node or not 0 <= code < 26:
+            return None, False
+        edges = self._edges
+        while True:
+            edge = edges[node]
+            if edge & _LETTER_MASK == code:
+                return edge >> _CHILD_SHIFT, bool(edge & _END_OF_WORD)
+            if edge & _LAST_EDGE:
+                return None, False
+            node += 1
+
+    def walk(self, word):
+        """Returns (node, is_word) reached by the word, node is None if it falls off"""
+        edges = self._edges
+        node, is_word = self.root, False
+        for letter in word.upper():
+            code = ord(letter) - 65
+            if not node or not 0 <= code < 26:
+                return None, False
+            while True:
+                edge = edges[node]
+                if edge & _LETTER_MASK == code:
+                    break
+                if edge & _LAST_EDGE:
+                    return None, False
+                node += 1
+            node, is_word = edge >> _CHILD_SHIFT, bool(edge & _END_OF_WORD)
+        return node, is_word
+
+    def _words_from(self, node, prefix):
+        for letter, is_word, child in self.edges(node):
+            word = prefix + letter
+            if is_word:
+                yield word
+            yield from self._words_from(child, word)
+
+    @staticmethod
+    def _build(words):
+        """
+        Builds the minimized DAWG from the words and flattens it into an
+        edge array. Returns (edges, number of words).
+        """
+        ids = iter(range(1 << 30))
+        root = _BuildNode(next(ids))
+        minimized = {}
+        unchecked = []  # (parent, letter, child) along the last word
+
+        def minimize(down_to):
+            while len(unchecked) > down_to:
+                parent, letter, child = unchecked.pop()
+                key = child.key()
+                if key in minimized:
+                    parent.edges[letter] = minimized[key]
+                else:
+                    minimized[key] = child
+
+        count = 0
+        previous = ''
+        for word in sorted(set(w.upper() for w in words)):
+            if not word or not all('A' <= letter <= 'Z' for letter in word):
+                continue
+            common = 0
+            for a, b in zip(word, previous):
+                if a != b:
+                    break
+                common += 1
+            minimize(common)
+            node = unchecked[-1][2] if unchecked else root
+            for letter in word[common:]:
+                child = _BuildNode(next(ids))
+                node.edges[letter] = child
+                unchecked.append((node, letter, child))
+                node = child
+            node.final = True
+            count += 1
+            previous = word
+        minimize(0)
+
+        # Lay out every node's edges contiguously, index 0 is left unused so
+        # that a child index of 0 can mean "no edges"
+        order = []
+        offsets = {}
+        size = 1
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            if node.id in offsets or not node.edges:
+                continue
+            offsets[node.id] = size
+            size += len(node.edges)
+            order.append(node)
+            pending.extend(node.edges.values())
+
+        edges = array('I', bytes(4 * size))
+        for node in order:
+            index = offsets[node.id]
+            letters = sorted(node.edges)
+            for letter in letters:
+                child = node.edges[letter]
+                edge = (ord(letter) - 65) | offsets.get(child.id, 0) << _CHILD_SHIFT
+                if child.final:
+                    edge |= _END_OF_WORD
+                if letter == letters[-1]:
+                    edge |= _LAST_EDGE
+                edges[index] = edge
+                index += 1
+        return edges, count
+
+
+_STAR = object()
+_ANY = (1 << 26) - 1
+
+
+def _letter_mask(letters):
+    mask = 0
+    for letter in letters:
+        letter = letter.upper()
+        if not 'A' <= letter <= 'Z':
+            raise ValueError(f"Invalid letter in pattern: {letter!r}")
+        mask |= 1 << (ord(letter) - 65)
+    return mask
+
+
+def _parse_pattern(pattern):
+    """Turns a query pattern into a list of letter masks and _STAR"""
+    if not isinstance(pattern, str):
+        tokens = []
+        for constraint in pattern:
+            if constraint is None or constraint == '?':
+                tokens.append(_ANY)
+            elif constraint == '*':
+                tokens.append(_STAR)
+            elif isinstance(constraint, int):
+                tokens.append(constraint & _ANY)
+            else:
+                tokens.append(_letter_mask(constraint))
+        return tokens
+
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '?':
+            tokens.append(_ANY)
+        elif char == '*':
+            tokens.append(_STAR)
+        elif char == '[':
+            end = pattern.find(']', i)
+            if end == -1:
+                raise ValueError(f"Unclosed '[' in pattern: {pattern!r}")
+            letters = pattern[i + 1:end]
+            if letters.startswith('^'):
+                tokens.append(_ANY & ~_letter_mask(letters[1:]))
+            else:
+                tokens.append(_letter_mask(letters))
+            i = end
+        else:
+            tokens.append(_letter_mask(char))
+        i += 1
+    return tokens
+
+
+def _read_compiled_header(buffer):
+    """Returns (flags, words, edges, digest) of a compiled image, or None"""
+    if len(buffer) < _COMPILED_HEADER.size:
+        return None
+    magic, version, flags, count, num_edges, digest = _COMPILED_HEADER.unpack_from(buffer)
+    if magic != _COMPILED_MAGIC or version != COMPILED_VERSION:
+        return None
+    if len(buffer) < _COMPILED_HEADER.size + 4 * num_edges:
+        return None
+    return flags, count, num_edges, digest
+
+
+def source_digest(path):
+    """sha256 of a word list file"""
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+def load_lexicon(dict_file):
+    """The compiled lexicon for the word list, or one built from it"""
+    lexicon = Lexicon.load_compiled(dict_file)
+    if lexicon is None:
+        lexicon = Lexicon.from_file(dict_file)
+    return lexicon
+
+
+def compile_lexicon(source, target=None):
+    """
+    Compiles a word list into a binary DAWG that Scrabble memory maps at
+    startup instead of sorting and indexing the list.
+    Returns the path of the compiled file.
+    """
+    if target is None:
+        target = source + COMPILED_SUFFIX
+    lexicon = Lexicon.from_file(source)
+    lexicon.save(target, source_digest(source))
+    return target
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrabble dictionary tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = commands.add_parser('compile-lexicon',
+                                         help='compile a word list into a binary DAWG')
+    compile_parser.add_argument('source', help='newline separated word list')
+    compile_parser.add_argument('-o', '--output', help='compiled file (default: <source>%s)' % COMPILED_SUFFIX)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compile-lexicon':
+        target = compile_lexicon(args.source, args.output)
+        print(f"Compiled {args.source} into {target}")
+
+
+if __name__ == '__main__':
+    main()
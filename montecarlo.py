@@ -0,0 +1,251 @@
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from board import Board
+from leaves import LEAVES_FILE, LeaveTable, leave_of
+from lexicon import Lexicon
+from movegen import CrossChecks, generate_moves
+
+# What the player to move knows: the board codes, their rack, the rack
+# sizes of the other players in turn order and the tiles they cannot see
+Position = namedtuple('Position', ['cells', 'rack', 'rack_sizes', 'unseen'])
+Evaluation = namedtuple('Evaluation', ['move', 'equity', 'rollouts'])
+
+
+def snapshot(game):
+    """The Position of the current player of a Scrabble game"""
+    player = game.current_player
+    players = game.get_active_players()
+    i = players.index(player)
+    others = players[i + 1:] + players[:i]
+    return Position(bytes(game._board.cells), list(game.get_rack(player)),
+                    [len(game.get_rack(other)) for other in others], list(game.unseen(player)))
+
+
+def rollout(board, cross_checks, position, move, rng, plies=2, leaves=None, deadline=None):
+    """
+    Plays the move and then plies - 1 greedy replies on the board and its
+    cross-checks, with the other players' racks and the bag drawn at random
+    from the unseen tiles. Every move is taken back before returning the
+    points the mover gained over everyone else, plus the value in leaves (a
+    LeaveTable) of the tiles the mover kept after their last move, or None
+    if the deadline (a time.time()) passed before the last reply.
+    """
+    unseen = position.unseen[:]
+    rng.shuffle(unseen)
+    racks = [leave_of(position.rack, move.tiles)]
+    for size in position.rack_sizes:
+        racks.append(unseen[:size])
+        del unseen[:size]
+    bag = unseen
+
+    spread = 0
+    played = []
+    tiles, score, rack = move.tiles, move.score, racks[0]
+    kept = rack[:]
+    try:
+        for ply in range(plies):
+            if ply:
+                if deadline is not None and time.time() >= deadline:
+                    return None
+                rack = racks[ply % len(racks)]
+                moves = generate_moves(board, rack, cross_checks.lexicon, cross_checks)
+                if not moves:
+                    continue
+                tiles, score = moves[0].tiles, moves[0].score
+                rack[:] = leave_of(rack, tiles)
+                if not ply % len(racks):
+                    kept = rack[:]
+            for row, col, letter in tiles:
+                board.place(row, col, letter)
+            played.append((tiles, cross_checks.update(tiles)))
+            spread += -score if ply % len(racks) else score
+            # The bag was shuffled, so its end is a random draw
+            drawn = min(len(tiles), len(bag))
+            rack.extend(bag[len(bag) - drawn:])
+            del bag[len(bag) - drawn:]
+            if not rack:
+                break
+    finally:
+        for tiles, changes in reversed(played):
+            for row, col, _ in tiles:
+                board.remove(row, col)
+            cross_checks.restore(changes)
+    if leaves is not None:
+        spread += leaves[kept]
+    return spread
+
+
+def _rollouts(lexicon, position, candidates, seed, plies, base=None, leaves=None,
+              deadline=None):
+    """
+    One sample of the unseen tiles played out for every candidate, so all
+    candidates face the same racks. base is a (board, cross_checks) pair
+    already built for the position. Returns None if the deadline (a
+    time.time()) passes before every candidate is played out.
+    """
+    if base is None:
+        board = Board.from_cells(position.cells)
+        base = board, CrossChecks(board, lexicon)
+    spreads = []
+    for move in candidates:
+        if deadline is not None and time.time() >= deadline:
+            return None
+        # Reseeding gives each candidate the same draw
+        spread = rollout(base[0], base[1], position, move, random.Random(seed), plies, leaves,
+                         deadline)
+        if spread is None:
+            return None
+        spreads.append(spread)
+    return spreads
+
+
+_worker_lexicon = None
+# Leave tables by file, memory mapped so the workers share their pages
+_worker_leaves = {}
+_worker_base = (None, None)
+
+
+def _init_worker(segment_name):
+    global _worker_lexicon
+    _worker_lexicon = Lexicon.attach(segment_name, shared_tracker=True)
+
+
+def _rollouts_in_worker(position, candidates, seed, plies, leaves_file, deadline):
+    global _worker_base
+    # The board is built once per position, rollouts undo their moves
+    cells, base = _worker_base
+    if cells != position.cells:
+        board = Board.from_cells(position.cells)
+        base = board, CrossChecks(board, _worker_lexicon)
+        _worker_base = position.cells, base
+    leaves = None
+    if leaves_file:
+        if leaves_file not in _worker_leaves:
+            _worker_leaves[leaves_file] = LeaveTable.load(leaves_file)
+        leaves = _worker_leaves[leaves_file]
+    return _rollouts(_worker_lexicon, position, candidates, seed, plies, base, leaves, deadline)
+
+
+class RolloutPool:
+    """
+    Worker processes for simulate_candidates that attach to one shared
+    copy of a lexicon, kept across calls so that a player simulating every
+    turn starts them once. Close it, or use it as a context manager, when
+    done.
+    """
+    def __init__(self, lexicon, workers=None):
+        self.lexicon = lexicon
+        self.workers = workers or os.cpu_count()
+        self._segment = lexicon.share()
+        self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(self._segment.name,))
+
+    def submit(self, *args):
+        """Runs _rollouts_in_worker on a worker, returns its Future"""
+        return self._executor.submit(_rollouts_in_worker, *args)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+        self._segment.close()
+        self._segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def simulate_candidates(game, candidates, iterations=100, time_budget=None,
+                        plies=2, workers=None, seed=None, leaves_file=LEAVES_FILE, pool=None):
+    """
+    Ranks candidate moves (e.g. the best few of generate_moves) for the
+    current player by their mean equity over iterations random rollouts.
+
+    Each rollout samples the other racks from the unseen tiles and plays
+    plies moves, the candidate and then greedy replies. Its equity is the
+    spread plus the value of the tiles the mover kept after their last
+    move, from the LeaveTable saved in leaves_file. With leaves_file None,
+    or no table fitted yet in LEAVES_FILE, it is the spread.
+
+    Rollouts run in this process if workers is 1, otherwise on pool, a
+    RolloutPool sharing the game's lexicon, or on a pool of workers
+    processes started for this call. Samples are merged as they finish.
+    Once time_budget seconds have passed no rollout is started, samples
+    not yet played out for every candidate are dropped and the ranking is
+    returned with the samples done so far.
+    Returns Evaluation(move, equity, rollouts) best first, a candidate with
+    no rollouts keeps its score and leave value as equity.
+    """
+    # Wall clock, so that worker processes can check it too
+    deadline = None if time_budget is None else time.time() + time_budget
+    rng = random.Random(seed)
+    candidates = list(candidates)
+    position = snapshot(game)
+    if leaves_file == LEAVES_FILE and not os.path.exists(leaves_file):
+        leaves_file = None
+    leaves = LeaveTable.load(leaves_file) if leaves_file else None
+    totals = [0] * len(candidates)
+    done = 0
+
+    def merge(spreads):
+        nonlocal done
+        if spreads is None:
+            return
+        for i, spread in enumerate(spreads):
+            totals[i] += spread
+        done += 1
+
+    def expired():
+        return deadline is not None and time.time() >= deadline
+
+    if pool is None and workers == 1:
+        lexicon = game.words if isinstance(game.words, Lexicon) else \
+            Lexicon.from_file(game.dict_file)
+        # Rollouts take their moves back off the game's board
+        checks = game._cross_checks or CrossChecks(game._board, lexicon)
+        base = game._board, checks
+        while done < iterations and not expired():
+            merge(_rollouts(lexicon, position, candidates, rng.getrandbits(64), plies, base,
+                            leaves, deadline))
+    else:
+        own_pool = pool is None
+        if own_pool:
+            lexicon = game.words if isinstance(game.words, Lexicon) else \
+                Lexicon.from_file(game.dict_file)
+            pool = RolloutPool(lexicon, workers)
+        pending = set()
+        try:
+            submitted = 0
+            while submitted < min(iterations, 2 * pool.workers):
+                pending.add(pool.submit(position, candidates, rng.getrandbits(64), plies,
+                                        leaves_file, deadline))
+                submitted += 1
+            while pending and not expired():
+                timeout = None if deadline is None else deadline - time.time()
+                finished, pending = wait(pending, timeout, FIRST_COMPLETED)
+                for future in finished:
+                    merge(future.result())
+                    if submitted < iterations:
+                        pending.add(pool.submit(position, candidates, rng.getrandbits(64),
+                                                plies, leaves_file, deadline))
+                        submitted += 1
+        finally:
+            # Samples not started are cancelled, running ones stop at the deadline
+            for future in pending:
+                future.cancel()
+            if own_pool:
+                pool.close()
+
+    if done:
+        equities = [total / done for total in totals]
+    else:
+        equities = [move.score + (leaves.value(position.rack, move.tiles) if leaves else 0)
+                    for move in candidates]
+    evaluations = [Evaluation(move, equities[i], done) for i, move in enumerate(candidates)]
+    evaluations.sort(key=lambda evaluation: evaluation.equity, reverse=True)
+    return evaluations
@@ -0,0 +1,275 @@
+from collections import namedtuple
+from constants import LETTERS_FREQS, LETTER_SCORE
+from scoring import BINGO_BONUS, LETTER_MULTIPLIER_TABLE, RACK_SIZE, WORD_MULTIPLIER_TABLE
+
+ALL_LETTERS = (1 << 26) - 1
+_LOWER = {chr(code): chr(code + 32) for code in range(65, 91)}
+
+# tiles are (row, col, letter) as accepted by Scrabble.submit_turn, a blank
+# played as a letter is the upper case letter
+Move = namedtuple('Move', ['tiles', 'word', 'score'])
+
+
+def tile_score(letter):
+    """Score of a tile on the board, blanks (upper case or ' ') are worth 0"""
+    return LETTER_SCORE.get(letter, 0)
+
+
+def cross_check(lexicon, board, row, col, vertical):
+    """
+    Computes the cross-check of an empty square for a main word going down
+    the column if vertical, otherwise along the row.
+
+    Returns (mask, score): mask has a bit set for every letter that forms a
+    valid perpendicular word, score is the value of the perpendicular tiles
+    or None if the square has no perpendicular neighbours.
+    """
+    # The cross word runs along the other direction
+    index, pos = (row, col) if vertical else (col, row)
+    start, end = board.span(index, not vertical, 1 << pos)
+    if start == end:
+        return ALL_LETTERS, None
+
+    cells = board.line(index, not vertical)
+    prefix = ''.join(cells[start:pos]).upper()
+    suffix = ''.join(cells[pos + 1:end + 1]).upper()
+    score = sum(tile_score(cells[i]) for i in range(start, end + 1) if i != pos)
+
+    mask = 0
+    node, _ = lexicon.walk(prefix)
+    if node is None:
+        return 0, score
+    for letter, is_word, child in lexicon.children(node):
+        for next_letter in suffix:
+            if child is None:
+                break
+            child, is_word = lexicon.step(child, next_letter)
+        if child is not None and is_word:
+            mask |= 1 << (ord(letter) - 65)
+    return mask, score
+
+
+class CrossChecks:
+    """
+    Cross-checks and anchors of a board, kept up to date as moves are placed.
+
+    masks[vertical][line][pos] is the cross-check mask of an empty square
+    for a main word along the rows (vertical=0) or the columns (vertical=1),
+    in line order: (row, col) for rows and (col, row) for columns.
+    scores holds the matching perpendicular tile values, None where no
+    cross word is formed. anchors holds (row, col) of every anchor square.
+    """
+    def __init__(self, board, lexicon):
+        """Computes the cache for the whole board"""
+        self.board = board
+        self.lexicon = lexicon
+        self.masks = [[[ALL_LETTERS] * 15 for _ in range(15)] for _ in range(2)]
+        self.scores = [[[None] * 15 for _ in range(15)] for _ in range(2)]
+        self.anchors = set()
+        self.rebuild()
+
+    def rebuild(self):
+        """Recomputes every square from the board"""
+        board = self.board
+        self.anchors.clear()
+        for row in range(15):
+            for col in range(15):
+                if board.get(row, col) is None:
+                    self._refresh(row, col)
+        if board.is_empty():
+            self.anchors.add((7, 7))
+
+    def update(self, tiles):
+        """
+        Updates the cache after the tiles were placed on the board. Only the
+        squares at the ends of the runs through the new tiles change.
+        Returns the previous state of those squares for restore().
+        """
+        board = self.board
+        changes = [self._save(7, 7)]
+        self.anchors.discard((7, 7))
+        squares = set()
+        for row, col, _ in tiles:
+            changes.append(self._save(row, col))
+            self.anchors.discard((row, col))
+            top, bottom = board.span(col, True, 1 << row)
+            left, right = board.span(row, False, 1 << col)
+            squares.update(((top - 1, col), (bottom + 1, col), (row, left - 1), (row, right + 1)))
+
+        for row, col in squares:
+            if 0 <= row < 15 and 0 <= col < 15 and board.get(row, col) is None:
+                changes.append(self._save(row, col))
+                self._refresh(row, col)
+        return changes
+
+    def restore(self, changes):
+        """Undoes an update() once its tiles are off the board again"""
+        masks, scores = self.masks, self.scores
+        for row, col, across, down, is_anchor in reversed(changes):
+            masks[0][row][col], scores[0][row][col] = across
+            masks[1][col][row], scores[1][col][row] = down
+            if is_anchor:
+                self.anchors.add((row, col))
+            else:
+                self.anchors.discard((row, col))
+
+    def check(self, row, col, vertical):
+        """(mask, score) of the empty square for a main word in the direction"""
+        if vertical:
+            return self.masks[1][col][row], self.scores[1][col][row]
+        return self.masks[0][row][col], self.scores[0][row][col]
+
+    def _save(self, row, col):
+        return (row, col, (self.masks[0][row][col], self.scores[0][row][col]),
+                (self.masks[1][col][row], self.scores[1][col][row]), (row, col) in self.anchors)
+
+    def _refresh(self, row, col):
+        """Recomputes both cross-checks of an empty square and its anchor flag"""
+        for vertical in (0, 1):
+            line, pos = (col, row) if vertical else (row, col)
+            mask, score = cross_check(self.lexicon, self.board, row, col, vertical)
+            self.masks[vertical][line][pos] = mask
+            self.scores[vertical][line][pos] = score
+        if self.board.has_neighbour(row, col):
+            self.anchors.add((row, col))
+        else:
+            self.anchors.discard((row, col))
+
+
+def generate_moves(board, rack, lexicon, cross_checks=None):
+    """
+    Lists every legal move for the rack on the board, best score first.
+    cross_checks is the board's CrossChecks cache, computed if not given.
+
+    Uses the anchor and cross-check algorithm of Appel and Jacobson over the
+    Lexicon's DAWG: each row and column is searched from its anchor squares,
+    growing a left part into the empty squares before the anchor and then
+    extending right through existing tiles.
+    """
+    counts = dict.fromkeys(LETTERS_FREQS, 0)
+    for letter in rack:
+        counts[letter] += 1
+    children = lexicon.children
+    if cross_checks is None:
+        cross_checks = CrossChecks(board, lexicon)
+
+    moves = []
+    single_tiles = set()
+    for vertical in (False, True):
+        if vertical:
+            anchors = {(col, row) for row, col in cross_checks.anchors}
+        else:
+            anchors = cross_checks.anchors
+
+        for line in range(15):
+            row = board.line(line, vertical)
+            masks = cross_checks.masks[vertical][line]
+            cross_scores = cross_checks.scores[vertical][line]
+
+            # Flat board index of pos is first + pos * step
+            first, step = (line, 15) if vertical else (line * 15, 1)
+
+            def record(start, end, placed):
+                """Scores the word on [start, end] and adds the move"""
+                new = dict(placed)
+                main = 0
+                word_multiplier = 1
+                cross_total = 0
+                word = ''
+                for pos in range(start, end + 1):
+                    if pos in new:
+                        letter = new[pos]
+                        square = first + pos * step
+                        multiplier = WORD_MULTIPLIER_TABLE[square]
+                        value = tile_score(letter) * LETTER_MULTIPLIER_TABLE[square]
+                        main += value
+                        word_multiplier *= multiplier
+                        cross_score = cross_scores[pos]
+                        if cross_score is not None:
+                            cross_total += (cross_score + value) * multiplier
+                    else:
+                        letter = row[pos]
+                        main += tile_score(letter)
+                    word += letter.upper()
+                score = main * word_multiplier + cross_total
+                if len(placed) == RACK_SIZE:
+                    score += BINGO_BONUS
+
+                if vertical:
+                    tiles = [(pos, line, letter) for pos, letter in placed]
+                else:
+                    tiles = [(line, pos, letter) for pos, letter in placed]
+                if len(tiles) == 1:
+                    # A single tile is found along both of its lines
+                    if tiles[0] in single_tiles:
+                        return
+                    single_tiles.add(tiles[0])
+                moves.append(Move(tiles, word, score))
+
+            def extend_right(node, is_word, pos, start, placed, anchor):
+                if pos > 14 or row[pos] is None:
+                    if is_word and placed and pos > anchor:
+                        record(start, pos - 1, placed)
+                    if pos > 14 or not node:
+                        return
+                    mask = masks[pos]
+                    for letter, child_is_word, child in children(node):
+                        if not mask >> (ord(letter) - 65) & 1:
+                            continue
+                        # Play the tile itself and, if there is one, a blank
+                        lower = _LOWER[letter]
+                        if counts[lower]:
+                            counts[lower] -= 1
+                            placed.append((pos, lower))
+                            extend_right(child, child_is_word, pos + 1, start, placed, anchor)
+                            placed.pop()
+                            counts[lower] += 1
+                        if counts[' ']:
+                            counts[' '] -= 1
+                            placed.append((pos, letter))
+                            extend_right(child, child_is_word, pos + 1, start, placed, anchor)
+                            placed.pop()
+                            counts[' '] += 1
+                else:
+                    child, child_is_word = lexicon.step(node, row[pos].upper())
+                    if child is not None:
+                        extend_right(child, child_is_word, pos + 1, start, placed, anchor)
+
+            def left_part(node, letters, limit, anchor):
+                start = anchor - len(letters)
+                placed = [(start + i, letter) for i, letter in enumerate(letters)]
+                extend_right(node, False, anchor, start, placed, anchor)
+                if not limit or not node:
+                    return
+                for letter, _, child in children(node):
+                    # Squares left of the anchor have no cross words
+                    lower = _LOWER[letter]
+                    if counts[lower]:
+                        counts[lower] -= 1
+                        left_part(child, letters + [lower], limit - 1, anchor)
+                        counts[lower] += 1
+                    if counts[' ']:
+                        counts[' '] -= 1
+                        left_part(child, letters + [letter], limit - 1, anchor)
+                        counts[' '] += 1
+
+            for pos in range(15):
+                if (line, pos) not in anchors:
+                    continue
+                if pos > 0 and row[pos - 1] is not None:
+                    # The word starts with the tiles already left of the anchor
+                    start = pos
+                    while start > 0 and row[start - 1] is not None:
+                        start -= 1
+                    node, _ = lexicon.walk(''.join(row[start:pos]))
+                    if node is not None:
+                        extend_right(node, False, pos, start, [], pos)
+                else:
+                    limit = 0
+                    while (pos - limit > 0 and row[pos - limit - 1] is None and
+                           (line, pos - limit - 1) not in anchors):
+                        limit += 1
+                    left_part(lexicon.root, [], min(limit, RACK_SIZE - 1), pos)
+
+    moves.sort(key=lambda move: move.score, reverse=True)
+    return moves
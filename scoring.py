@@ -0,0 +1,100 @@
+from board import CODES, SIZE
+from constants import LETTER_SCORE, WORD_MULTIPLIERS, LETTER_MULTIPLIERS
+
+BINGO_BONUS = 50
+RACK_SIZE = 7
+
+# Premium squares indexed by row * 15 + col
+LETTER_MULTIPLIER_TABLE = bytes(LETTER_MULTIPLIERS.get(divmod(square, SIZE), 1)
+                                for square in range(SIZE * SIZE))
+WORD_MULTIPLIER_TABLE = bytes(WORD_MULTIPLIERS.get(divmod(square, SIZE), 1)
+                              for square in range(SIZE * SIZE))
+
+# Tile value of each board letter code, blanks and empty squares are 0
+CODE_SCORES = [0] * 64
+for _letter, _code in CODES.items():
+    CODE_SCORES[_code] = LETTER_SCORE.get(_letter, 0)
+
+
+def score_word(cells, first, step, length, new_mask):
+    """
+    Score of a word read from a flat array of letter codes that already
+    holds the new tiles. The word starts at square first and its squares
+    are step apart (1 along a row, 15 down a column). Bit i of new_mask is
+    set when the ith letter is a new tile, only those get premiums.
+    """
+    stop = first + step * length
+    score = sum(map(CODE_SCORES.__getitem__, cells[first:stop:step]))
+    multiplier = 1
+    while new_mask:
+        low = new_mask & -new_mask
+        square = first + step * (low.bit_length() - 1)
+        score += CODE_SCORES[cells[square]] * (LETTER_MULTIPLIER_TABLE[square] - 1)
+        multiplier *= WORD_MULTIPLIER_TABLE[square]
+        new_mask ^= low
+    return score * multiplier
+
+
+def move_words(board, tiles):
+    """
+    Yields (tile, vertical, index, start, end, mask) for every word a move
+    forms on the board: the main word along the tiles with tile None, then
+    the word across each tile with that tile. The word runs from start to
+    end of row index, or column index if vertical, and bit i of mask is set
+    for the new tile at position i of the line. Assumes tiles are colinear
+    and contiguous.
+    """
+    # Also vertical if only one tile was placed
+    vertical = len(set(col for _, col, _ in tiles)) == 1
+    row, col, _ = tiles[0]
+    index = col if vertical else row
+    mask = 0
+    for tile_row, tile_col, _ in tiles:
+        mask |= 1 << (tile_row if vertical else tile_col)
+    start, end = board.span(index, vertical, mask)
+    if start != end:
+        yield None, vertical, index, start, end, mask
+    for tile in tiles:
+        row, col, _ = tile
+        index, mask = (row, 1 << col) if vertical else (col, 1 << row)
+        start, end = board.span(index, not vertical, mask)
+        if start != end:
+            yield tile, not vertical, index, start, end, mask
+
+
+def score_line(cells, vertical, index, start, end, mask):
+    """score_word of a word from move_words, cells holding the new tiles"""
+    if vertical:
+        first, step = start * SIZE + index, SIZE
+    else:
+        first, step = index * SIZE + start, 1
+    return score_word(cells, first, step, end - start + 1, mask >> start)
+
+
+def score_move(board, tiles, cells=None):
+    """
+    Score of a legal move on the board: the main word, every cross word and
+    the bingo bonus. cells may be a scratch copy of board.cells to write the
+    tiles into, it is returned unchanged.
+    """
+    if cells is None:
+        cells = bytearray(board.cells)
+    squares = []
+    for row, col, letter in tiles:
+        square = row * SIZE + col
+        squares.append((square, cells[square]))
+        cells[square] = CODES[letter]
+
+    score = sum(score_line(cells, *word[1:]) for word in move_words(board, tiles))
+    if len(tiles) == RACK_SIZE:
+        score += BINGO_BONUS
+
+    for square, code in squares:
+        cells[square] = code
+    return score
+
+
+def score_moves(board, moves):
+    """Scores a batch of legal moves (lists of tiles) against one board"""
+    cells = bytearray(board.cells)
+    return [score_move(board, tiles, cells) for tiles in moves]
@@ -1,32 +1,319 @@
-from random import shuffle
-from constants import LETTERS_FREQS, LETTER_SCORE, WORD_MULTIPLIERS, LETTER_MULTIPLIERS
+import json
+import logging
+import struct
+from array import array
+from collections import Counter, namedtuple
+from enum import Enum
+from time import perf_counter
+from board import CODES, LETTERS, Board, SIZE
+from constants import LETTERS_FREQS
+from game_log import event
+from lexicon import Lexicon, WordFile
+from movegen import CrossChecks, generate_moves, tile_score
+from scoring import (BINGO_BONUS, LETTER_MULTIPLIER_TABLE, RACK_SIZE, WORD_MULTIPLIER_TABLE,
+                     move_words, score_line)
+from tile_bag import TILES, TileBag
+from transposition import MAX_PLAYERS, board_key, position_hash, rack_key, turn_key
+from turn_stats import TimedWords, TurnStats
+from unseen import UnseenTiles
+
+# Game events are logged at INFO, nothing is formatted unless it is enabled
+logger = logging.getLogger(__name__)
+
+# The binary form of a game, see Scrabble.to_bytes
+SAVE_VERSION = 1
+_SAVE_MAGIC = b'SCRBGAME'
+# magic, version, flags, players, current player, move count
+_SAVE_HEADER = struct.Struct('<8sHHBBH')
+# Flag set when the bag's random state follows
+_SAVE_RNG = 1
+# Version of the random state TileBag keeps, see random.Random.getstate
+_RNG_VERSION = 3
+_RNG_WORDS = 625
+# Codes a saved board and saved racks may hold
+_BOARD_CODES = bytes([0] + [code for code, letter in enumerate(LETTERS) if letter])
+_RACK_CODES = bytes(CODES[tile] for tile in TILES)
+
+
+class Rejection(Enum):
+    """Why evaluate_move rejected a move, the value is the message"""
+    NO_TILES = "No tiles placed"
+    NOT_FROM_RACK = "Not all letters are from the rack"
+    NOT_COLINEAR = "Tiles are not colinear"
+    NOT_UNIQUE = "Tiles are not uniquely placed"
+    NOT_EMPTY = "Tiles are not on empty squares"
+    NOT_CONTIGUOUS = "Tiles are not contiguous"
+    NOT_ON_STAR = "First move wasn't on star"
+    NOT_TOUCHING = "Tiles do not touch existing tiles"
+    INVALID_WORD = "Invalid word"
+    NO_WORD = "No word made"
+
+
+class MoveResult(namedtuple('MoveResult', ['valid', 'words', 'score', 'reason'])):
+    """
+    The outcome of evaluate_move: whether the move is legal, the words it
+    forms (the invalid word if one was), its score and, for an illegal
+    move, the Rejection. It is true only for a legal move.
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return self.valid
+
+
+# What Scrabble.undo needs to take back a move made with Scrabble.apply:
+# the tiles, who played them, the rack before the move, how many tiles
+# were drawn and the bag's random state before, the score, whose turn it
+# was, the cross-checks replaced and the position hash
+UndoToken = namedtuple('UndoToken', ['tiles', 'player', 'rack', 'drawn', 'bag_state', 'score',
+                                     'current_player', 'cross_checks', 'hash'])
+# A copy of a game's state that Scrabble.restore returns to
+GameSnapshot = namedtuple('GameSnapshot', ['cells', 'racks', 'bag', 'scores', 'move_count',
+                                           'current_player'])
+
+
+def _rack_letter(letter):
+    """
+    The rack tile used for a played letter: a blank played as a letter
+    is given as the upper case letter.
+    """
+    return ' ' if letter.isupper() else letter
+
+
+def _rejected(reason, words=()):
+    return MoveResult(False, list(words), 0, reason)
+
+
+def evaluate_move(board, rack, tiles, words, cross_checks=None, timer=None):
+    """
+    Validates and scores a move without changing any state, so it is safe
+    to call from many threads against the same game.
+
+    board is the Board before the move, rack the player's tiles, tiles the
+    (row, col, letter) placements and words the dictionary (a Lexicon or a
+    WordFile). cross_checks is the board's CrossChecks cache, if any.
+    timer, such as TimedWords.time, runs each check as
+    timer(phase, function, *args) to time it.
+    Returns MoveResult(valid, words, score, reason) with the words formed
+    and the score of the move, bingo included, or the Rejection.
+    """
+    if not tiles:
+        return _rejected(Rejection.NO_TILES)
+
+    rows = [row for row, _, _ in tiles]
+    cols = [col for _, col, _ in tiles]
+    letters = [letter for _, _, letter in tiles]
+    call = _untimed if timer is None else timer
+
+    if not call('rack_check', _all_letters_from_rack, rack, letters):
+        return _rejected(Rejection.NOT_FROM_RACK)
+    if not call('colinear', _is_colinear, rows, cols):
+        return _rejected(Rejection.NOT_COLINEAR)
+    if not call('unique', _all_unique_places, rows, cols):
+        return _rejected(Rejection.NOT_UNIQUE)
+    if not call('empty', _all_empty_places, board, rows, cols):
+        return _rejected(Rejection.NOT_EMPTY)
+    if not call('contiguous', _is_contiguous, board, rows, cols):
+        return _rejected(Rejection.NOT_CONTIGUOUS)
+    if board.is_empty():
+        if (7, 7) not in zip(rows, cols):
+            return _rejected(Rejection.NOT_ON_STAR)
+    elif not call('touches_others', _touches_others, board, rows, cols):
+        return _rejected(Rejection.NOT_TOUCHING)
+    return call('scoring', _score_words, board, tiles, words, cross_checks)
+
+
+def _untimed(phase, function, *args):
+    return function(*args)
+
+
+def _all_letters_from_rack(rack, letters):
+    """
+    Determines if all letters are present in the rack.
+    """
+    # Make a copy of the rack to validate without altering it
+    rack = list(rack)
+
+    for letter in letters:
+        letter = _rack_letter(letter)
+        if letter in rack:
+            rack.remove(letter)  # Temporarily remove the letter from the copied rack
+        else:
+            return False
+
+    return True
+
+
+def _is_colinear(rows, cols):
+    """
+    True if all rows are equal or all cols are equal.
+    """
+    return len(set(rows)) == 1 or len(set(cols)) == 1
+
+
+def _all_unique_places(rows, cols):
+    """
+    Cannot have duplicate places
+    """
+    places = list(zip(rows, cols))
+    return len(set(places)) == len(places)
+
+
+def _all_empty_places(board, rows, cols):
+    """
+    Tiles can only go on empty squares of the board.
+    """
+    for row, col in zip(rows, cols):
+        if not (0 <= row < SIZE and 0 <= col < SIZE) or board.get(row, col) is not None:
+            return False
+    return True
+
+
+def _is_contiguous(board, rows, cols):
+    """
+    Tiles must be in a contiguous line with existing tiles, if needed.
+    """
+    # Case: Only one tile
+    if len(cols) == len(rows) == 1:
+        return True
+
+    is_vertical = len(set(cols)) == 1
+    index, positions = (cols[0], rows) if is_vertical else (rows[0], cols)
+
+    mask = 0
+    for pos in positions:
+        mask |= 1 << pos
+    return board.is_filled(index, is_vertical, mask, min(positions), max(positions))
+
+
+def _touches_others(board, rows, cols):
+    """
+    Word being played must touch existing tiles.
+    """
+    for row, col in zip(rows, cols):
+        if board.has_neighbour(row, col):
+            return True
+    return False
+
+
+def _score_words(board, tiles, words, cross_checks):
+    """
+    Determines if all the words formed are valid and scores them.
+    Assumes tiles are colinear and contiguous.
+    """
+    letters = {}
+    for row, col, letter in tiles:
+        letters[(row, col)] = letter
+    # Letter codes of the board with the new tiles, for scoring
+    cells = board.overlay(tiles)
+
+    formed = []
+    score = 0
+    for tile, vertical, index, start, end, mask in move_words(board, tiles):
+        line = board.line(index, vertical)
+        word = ''
+        for pos in range(start, end + 1):
+            square = (pos, index) if vertical else (index, pos)
+            word += letters.get(square, line[pos])
+        word = word.upper()
+
+        if tile is not None and cross_checks is not None:
+            # A bit test of the cached cross-check replaces the lookup
+            row, col, played = tile
+            letter = played.lower()
+            mask_bits, cross_score = cross_checks.check(row, col, not vertical)
+            if not ('a' <= letter <= 'z' and mask_bits >> (ord(letter) - 97) & 1):
+                return _rejected(Rejection.INVALID_WORD, [word])
+            square = row * SIZE + col
+            value = tile_score(played) * LETTER_MULTIPLIER_TABLE[square]
+            score += (cross_score + value) * WORD_MULTIPLIER_TABLE[square]
+        else:
+            if word not in words:
+                return _rejected(Rejection.INVALID_WORD, [word])
+            score += score_line(cells, vertical, index, start, end, mask)
+        formed.append(word)
+
+    # A single tile has to make a word in one direction or the other
+    if not formed:
+        return _rejected(Rejection.NO_WORD)
+
+    if len(tiles) == RACK_SIZE:
+        score += BINGO_BONUS
+    return MoveResult(True, formed, score, None)
+
+
+def _pack_game(cells, racks, bag, rng, scores, eliminated, move_count, current_player):
+    """The to_bytes form of a game, bag being the tile counts and rng the random state or None"""
+    players = len(racks)
+    parts = [_SAVE_HEADER.pack(_SAVE_MAGIC, SAVE_VERSION, _SAVE_RNG if rng else 0, players,
+                               current_player, move_count),
+             bytes(cells), bytes(eliminated), struct.pack(f'<{players}i', *scores)]
+    for rack in racks:
+        parts.append(bytes([len(rack)] + [CODES[tile] for tile in rack]))
+    parts.append(bytes(bag))
+    if rng:
+        parts.append(array('I', rng).tobytes())
+    return b''.join(parts)
 
 
 class Scrabble:
-    def __init__(self, max_players=2, dict_file='words.txt'):
-        """Initialize the game"""
+    def __init__(self, max_players=2, dict_file='words.txt', seed=None, first_player=None):
+        """
+        Initialize the game.
+        dict_file is either the path of a word list or a Lexicon, which can
+        be shared by many games. A word list compiled with
+        `python lexicon.py compile-lexicon` is memory mapped when it is
+        current, otherwise the list is sorted and searched on disk.
+        seed makes the draws from the bag reproducible.
+        first_player is the player to move first. By default it is the last
+        one dealt to.
+        """
+        if not 1 <= max_players <= MAX_PLAYERS:
+            raise ValueError(f"A game has 1 to {MAX_PLAYERS} players")
+        if first_player is not None and not 1 <= first_player <= max_players:
+            raise ValueError(f"No Player {first_player}")
         self.dict_file = dict_file
-        self._populate_bag()
-        self.shuffle_bag()
-        self._board = [
-            [None] * 15 for _ in range(15)
-        ]
+        self._populate_bag(seed)
+        self._board = Board()
+        # Zobrist hash of the board and racks, see position_hash
+        self._hash = 0
         self._move_count = 0
         self.current_player = 1
         self.max_players = max_players
         self.player_racks = [[] for _ in range(self.max_players)]
+        # The tiles each player has not seen, see unseen
+        self._unseen = [UnseenTiles() for _ in range(self.max_players)]
         self._player_score = [0] * self.max_players
         for i in range(self.max_players):
             self._draw_tiles(7, i + 1)
-        self._turn_score = 0
+        if first_player is not None:
+            self.current_player = first_player
         self.eliminated = [0] * self.max_players
-        self.num_words = self._count_lines()
-        self.sort_words()
+        self._load_words()
+        # Cross-checks and anchors, kept while the dictionary is a DAWG
+        self._cross_checks = None
+        if isinstance(self.words, Lexicon):
+            self._cross_checks = CrossChecks(self._board, self.words)
+        # The TurnStats of submit_turn, None while they are disabled
+        self._stats = None
+
+    def _load_words(self):
+        """Sets words to the Lexicon or the indexed word list of dict_file"""
+        if isinstance(self.dict_file, Lexicon):
+            self.words = self.dict_file
+        else:
+            self.words = Lexicon.load_compiled(self.dict_file)
+            if self.words is None:
+                self.sort_words()
+                self.words = WordFile(self.dict_file)
+        self.num_words = len(self.words)
 
     def sort_words(self):
         """
         Reads the dictionary file, sorts the words alphabetically,
         and writes them back to the file.
+        The file is left untouched if it is already sorted, so the saved
+        line index stays valid between games.
         """
         try:
             # Read words from the file
@@ -35,23 +322,18 @@ class Scrabble:
 
             # Remove whitespace and sort the words
             words = [word.strip() for word in words]
+            if all(words[i] <= words[i + 1] for i in range(len(words) - 1)):
+                return
             words.sort()
 
             # Write the sorted words back to the file
             with open(self.dict_file, 'w') as file:
                 file.write('\n'.join(words))
 
-            print(f"Words in {self.dict_file} have been sorted successfully.")
+            logger.info("Words in %s have been sorted successfully.", self.dict_file)
 
         except Exception as e:
-            print(f"An error occurred while sorting words: {e}")
-
-    def _count_lines(self):
-        """
-        Returns the number of lines in the dictionary file.
-        """
-        with open(self.dict_file, 'r') as file:
-            return sum(1 for _ in file)
+            logger.error("An error occurred while sorting words: %s", e)
 
     def get_active_players(self):
         """Get the list of active players"""
@@ -59,11 +341,11 @@ class Scrabble:
 
     def remove_player(self, player):
         """Remove a player from the game"""
-        print(f"Removing Player {player}")
         self.eliminated[player - 1] = 1
         # self.player_racks.pop(player - 1)
         # self._player_score.pop(player - 1)
-        print(self.eliminated)
+        logger.info("Removing Player %d, eliminated: %s", player, list(self.eliminated),
+                    extra=event('eliminated', player=player))
         if len(self.get_active_players()) != 1:
             self.advance_turn()
 
@@ -80,13 +362,13 @@ class Scrabble:
     def _print_board(self):
         """Print the board and player racks"""
         for i in range(15):
-            for j in range(15):
-                if self._board[i][j] is None:
+            for letter in self._board.line(i):
+                if letter is None:
                     print('_', end='')
-                elif self._board[i][j] == ' ':
+                elif letter == ' ':
                     print('-', end='')
                 else:
-                    print(self._board[i][j], end='')
+                    print(letter, end='')
             print('')
 
         for i, rack in enumerate(self.player_racks, 1):
@@ -95,24 +377,29 @@ class Scrabble:
             else:
                 print(f"Player {i}'s rack:", ' '.join(rack))
 
-    def _populate_bag(self):
+    def _populate_bag(self, seed=None):
         """Populate the bag with the correct number of tiles"""
-        self._bag = []
-        for letter in LETTERS_FREQS:
-            for _ in range(LETTERS_FREQS[letter]):
-                self._bag.append(letter)
-
-    def shuffle_bag(self):
-        """Shuffle the bag of tiles"""
-        shuffle(self._bag)
+        self._bag = TileBag(seed=seed)
 
     def _draw_tiles(self, amount, player):
         """Draw tiles from the bag and add them to the player's rack"""
         # Draw tiles only for the current player
         self.current_player = player
+        rack = self.player_racks[player - 1]
+        drawn = []
         for _ in range(amount):
             if len(self._bag) > 0:
-                self.player_racks[player - 1].append(self._bag.pop())
+                tile = self._bag.draw()
+                self._hash ^= rack_key(player, tile, rack.count(tile))
+                rack.append(tile)
+                drawn.append(tile)
+        self._unseen[player - 1].see(drawn)
+
+    def _remove_from_rack(self, player, letter):
+        """Takes a tile off the player's rack"""
+        rack = self.player_racks[player - 1]
+        rack.remove(letter)
+        self._hash ^= rack_key(player, letter, rack.count(letter))
 
     def get_rack(self, player=None):
         """Get the rack of the current player"""
@@ -135,38 +422,99 @@ class Scrabble:
         Returns the old tiles to the bag and draws an equal number to replace
         them.
         """
-        # if self._all_letters_from_rack(old):
+        # A copy, old may be the rack itself, which changes below
+        old = list(old)
         if len(old) > len(self._bag):
             return
+        if not _all_letters_from_rack(self.get_rack(), old):
+            logger.warning("Tiles %s are not all on Player %d's rack.", old, self.current_player)
+            return
         # Add the new tiles to the rack
         self._draw_tiles(len(old), self.current_player)
 
-        # Remove the old from the rack and add them to the bag
+        # Remove the old from the rack and add them to the bag, draws are
+        # random so the bag needs no shuffle
         for letter in old:
-            self.player_racks[self.current_player - 1].remove(letter)
-            self._bag.append(letter)
-
-        self.shuffle_bag()
+            self._remove_from_rack(self.current_player, letter)
+        self._bag.put_back(old)
+        self._unseen[self.current_player - 1].unsee(old)
 
     def submit_turn(self, tiles):
-        """Submit the tiles to be placed on the board"""
+        """
+        Submit the tiles to be placed on the board. Returns the MoveResult,
+        which is true if the move was played.
+        """
         if self.eliminated[self.current_player - 1]:
             self.advance_turn()
-        if self._is_valid_move(tiles):
-            self._score_turn(tiles)
+        # Without stats the checks run untimed and nothing else is counted
+        stats = self._stats
+        if stats is None:
+            result = self.evaluate_move(tiles)
+        else:
+            started = perf_counter()
+            words = TimedWords(self.words, stats)
+            result = evaluate_move(self._board, self.get_rack(), tiles, words,
+                                   self._cross_checks, words.time)
+        if not result.valid:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Validation: %s", ': '.join([result.reason.value] + result.words),
+                            extra=event('rejected', player=self.current_player, tiles=tiles,
+                                        reason=result.reason.name, words=result.words))
+            if stats is not None:
+                stats.record_turn(perf_counter() - started, words.lookups, result.reason.name)
+            return result
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("All words validated",
+                        extra=event('validated', player=self.current_player, tiles=tiles,
+                                    words=result.words, score=result.score))
+        self._score_turn(result.score)
+        if stats is None:
             self._place_move(tiles)
             self._update_player_racks(tiles, self.current_player)
-            self.advance_turn()
-            return True
         else:
-            return False
+            stats.time('place', self._place_move, tiles)
+            stats.time('refill', self._update_player_racks, tiles, self.current_player)
+            stats.record_turn(perf_counter() - started, words.lookups)
+        self.advance_turn()
+        return result
+
+    def enable_stats(self, stats=None):
+        """
+        Times the phases of submit_turn and counts its outcomes and
+        dictionary lookups into stats, a new TurnStats by default, which
+        can be shared by several games. Returns the TurnStats.
+        """
+        self._stats = stats if stats is not None else TurnStats()
+        return self._stats
+
+    def disable_stats(self):
+        """Stops timing submit_turn, see enable_stats"""
+        self._stats = None
+
+    def stats(self):
+        """
+        The TurnStats of submit_turn, with snapshot() and prometheus()
+        exports, or None unless enable_stats was called.
+        """
+        return self._stats
+
+    def evaluate_move(self, tiles, player=None):
+        """
+        Validates and scores the tiles for the player (the current player by
+        default) without playing them, see evaluate_move.
+        """
+        return evaluate_move(self._board, self.get_rack(player), tiles,
+                             self.words, self._cross_checks)
 
     def advance_turn(self):
         """
         Advances the turn to the next player in sequence.
         """
         self.current_player = (self.current_player % self.max_players) + 1
-        print(f"It's now Player {self.current_player}'s turn.")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("It's now Player %d's turn.", self.current_player,
+                        extra=event('turn', player=self.current_player))
 
     def _update_player_racks(self, tiles, player):
         """
@@ -177,10 +525,11 @@ class Scrabble:
 
         # Remove the tiles from the player's rack
         for _, _, letter in tiles:
+            letter = _rack_letter(letter)
             if letter in current_player_rack:
-                current_player_rack.remove(letter)
+                self._remove_from_rack(player, letter)
             else:
-                print(f"Tile {letter} not found in current player's rack.")
+                logger.warning("Tile %s not found in current player's rack.", letter)
 
         # Draw new tiles for the current player
         self._draw_tiles(len(tiles), player)  # Draw the same number of tiles that were played
@@ -191,318 +540,50 @@ class Scrabble:
         Returns True if the list of tiles forms valid words and are placed
         in a correct manner.
         """
-        rows = []
-        cols = []
-        letters = []
-
-        for row, col, letter in tiles:
-            rows.append(row)
-            cols.append(col)
-            letters.append(letter)
-
-        # Reset score accumulation
-        self._turn_score = 0
-
-        return (
-                self._all_letters_from_rack(letters) and
-                self._is_colinear(rows, cols) and
-                self._all_unique_places(rows, cols) and
-                self._is_contiguous(rows, cols) and
-                self.touches_others(rows, cols) and
-                self.all_valid_words(tiles)
-        )
-
-    def _all_letters_from_rack(self, letters):
-        """
-        Determines if all letters are present in the current player's rack.
-        """
-        # Make a copy of the rack to validate without altering it
-        rack = self.player_racks[self.current_player - 1][:]  # Copy the current player's rack
-
-        for letter in letters:
-            if letter in rack:
-                rack.remove(letter)  # Temporarily remove the letter from the copied rack
-            else:
-                print("Validation: Not all letters are from the rack")
-                return False
-
-        return True
-
-    def _is_colinear(self, rows, cols):
-        """
-        True if all rows are equal or all cols are equal.
-        """
-        ret = len(set(rows)) == 1 or len(set(cols)) == 1
-        if not ret:
-            print("Validation: Tiles are not colinear")
-
-        return ret
-
-
-    def _all_unique_places(self, rows, cols):
-        """
-        Cannot have duplicate places
-        """
-        places = list(zip(rows, cols))
-        ret = len(set(places)) == len(places)
-        if not ret:
-            print("Validation: Tiles are not uniquely placed")
-            print(places)
-        return ret
-
-
-    def _is_contiguous(self, rows, cols):
-        """
-        Tiles must be in a contiguous line with existing tiles, if needed.
-        """
-        # Case: Only one tile
-        if len(cols) == len(rows) == 1:
-            return True
-
-        is_vertical = len(set(cols)) == 1
-
-        if is_vertical:
-            start = min(rows)
-            end = max(rows)
-            col = cols[0]
-
-            for row in range(start, end):
-                if row not in rows and self._board[row][col] is None:
-                    print("Validation: Tiles are not contiguous")
-                    return False
-
-        else:
-            start = min(cols)
-            end = max(cols)
-            row = rows[0]
-
-            for col in range(start, end):
-                if col not in cols and self._board[row][col] is None:
-                    print("Validation: Tiles are not contiguous")
-                    return False
-
-        return True
-
+        return self.evaluate_move(tiles).valid
 
     def touches_others(self, rows, cols):
         """
         Word being played must touch existing tiles, or first move must start
         in the middle of the board.
         """
-        places = list(zip(rows, cols))
-
-        if self._move_count == 0:
-            ret = (7, 7) in places
-            if not ret:
-                print("Validation: First move wasn't on star")
-            return ret
-        else:
-            for row, col in places:
-                # Above
-                if row > 0 and self._board[row - 1][col] is not None:
-                    return True
-                # Below
-                if row < 14 and self._board[row + 1][col] is not None:
-                    return True
-                # Left
-                if col > 0 and self._board[row][col - 1] is not None:
-                    return True
-                # Right
-                if col < 14 and self._board[row][col + 1] is not None:
-                    return True
-            print("Validation: Tiles do not touch existing tiles")
-            return False
-
+        if self._board.is_empty():
+            return (7, 7) in zip(rows, cols)
+        return _touches_others(self._board, rows, cols)
 
     def all_valid_words(self, tiles):
         """
         Determines if all the words formed are valid.
-        Accumulates the score for valid words
         Assumes tiles are colinear and contiguous.
         """
-        rows = []
-        cols = []
-        letters = {}
-        for row, col, letter in tiles:
-            rows.append(row)
-            cols.append(col)
-            letters[(row, col)] = letter
-
-        is_vertical = len(set(cols)) == 1
-
-        if is_vertical:  # Also true if only one tile was placed
-            start = min(rows)
-            end = max(rows)
-            col = cols[0]
-
-            # Start may be extened by existing tiles
-            for row in range(start - 1, -1, -1):
-                if self._board[row][col] is not None:
-                    start = row
-                else:
-                    # Found first open place, quit
-                    break
-            # Same for the end
-            for row in range(end + 1, 15):
-                if self._board[row][col] is not None:
-                    end = row
-                else:
-                    # Found first open place, quit
-                    break
-
-            # If only one tile was played, there may not be a vertical word
-            if start != end:
-                # Check the word that was made vertically
-                word = ''
-                for row in range(start, end + 1):
-                    word += letters.get((row, col), self._board[row][col])
-                if not self._is_valid_word(word):
-                    print("Validation: Invalid word:", word)
-                    return False
-
-                self._score_word((start, col), (end, col), letters)
-
-            # Check all horizontal words made from each of the new tiles
-            for row, col, _ in tiles:
-                start_h = col
-                end_h = col
-
-                # Start may be extened by existing tiles
-                for col_h in range(start_h - 1, -1, -1):
-                    if self._board[row][col_h] is not None:
-                        start_h = col_h
-                    else:
-                        # Found first open place, quit
-                        break
-                # Same for the end
-                for col_h in range(end_h + 1, 15):
-                    if self._board[row][col_h] is not None:
-                        end_h = col_h
-                    else:
-                        # Found first open place, quit
-                        break
-
-                # No word made horizontally
-                if start_h == end_h:
-                    # Issue if only one tile was placed on start
-                    if len(tiles) == 1:
-                        print("Validation: Invalid word:", word)
-                        return False
-                    continue
-
-                # Make and check word
-                word = ''
-                for col_h in range(start_h, end_h + 1):
-                    word += letters.get((row, col_h), self._board[row][col_h])
-                if not self._is_valid_word(word):
-                    print("Validation: Invalid word:", word)
-                    return False
-
-                self._score_word((row, start_h), (row, end_h), letters)
-        else:  # is horizontal
-            start = min(cols)
-            end = max(cols)
-            row = rows[0]
-
-            # Start may be extened by existing tiles
-            for col in range(start - 1, -1, -1):
-                if self._board[row][col] is not None:
-                    start = col
-                else:
-                    # Found first open place, quit
-                    break
-            # Same for the end
-            for col in range(end + 1, 15):
-                if self._board[row][col] is not None:
-                    end = col
-                else:
-                    # Found first open place, quit
-                    break
-
-            # Check the word that was made horizontally
-            word = ''
-            for col in range(start, end + 1):
-                word += letters.get((row, col), self._board[row][col])
-            if not self._is_valid_word(word):
-                print("Validation: Invalid word:", word)
-                return False
-
-            self._score_word((row, start), (row, end), letters)
-
-            # Check all vertical words made from each of the new tiles
-            for row, col, _ in tiles:
-                start_v = row
-                end_v = row
-
-                # Start may be extened by existing tiles
-                for row_v in range(start_v - 1, -1, -1):
-                    if self._board[row_v][col] is not None:
-                        start_v = row_v
-                    else:
-                        # Found first open place, quit
-                        break
-                # Same for the end
-                for row_v in range(end_v + 1, 15):
-                    if self._board[row_v][col] is not None:
-                        end_v = row_v
-                    else:
-                        # Found first open place, quit
-                        break
-
-                # No word made vertically
-                if start_v == end_v:
-                    continue
-
-                # Make and check word
-                word = ''
-                for row_v in range(start_v, end_v + 1):
-                    word += letters.get((row_v, col), self._board[row_v][col])
-                if not self._is_valid_word(word):
-                    print("Validation: Invalid word:", word)
-                    return False
-
-                self._score_word((start_v, col), (end_v, col), letters)
-
-        # Validated all words
-        print("All words validated")
-        return True
-
+        return _score_words(self._board, tiles, self.words, self._cross_checks).valid
 
     def _is_valid_word(self, word):
         """
-        Uses binary search to determine if the word is valid, directly in the file.
-        """
-        word = word.upper()  # Ensure the word is in uppercase
-
-        # Open the file for reading
-        with open(self.dict_file, 'r') as file:
-            low, high = 0, self.num_words - 1  # Number of words in the file
-            # Binary search
-            while low <= high:
-                mid = (low + high) // 2
-                file.seek(self._get_line_offset(file, mid))
-                line = file.readline().strip().upper()  # Convert line to uppercase
-                # print(line)
-                if line == word:
-                    return True
-                elif line < word:
-                    low = mid + 1
-                else:
-                    high = mid - 1
-
-        return False
+        Determines if the word is valid, either with a walk of the in-memory
+        Lexicon or a binary search over the indexed dictionary file.
+        """
+        return word in self.words
 
 
-    def _get_line_offset(self, file, line_num):
+    def generate_moves(self, player=None):
         """
-        Returns the byte offset for the given line number.
+        Lists every legal move for the player's rack (the current player by
+        default) as Move(tiles, word, score), best score first.
         """
-        file.seek(0)
-        offset = 0
-        for i in range(line_num):
-            offset += len(file.readline()) + 1
-        return offset
+        self._build_cross_checks()
+        return generate_moves(self._board, self.get_rack(player), self.words,
+                              self._cross_checks)
 
+    def _build_cross_checks(self):
+        """
+        Builds the cross-checks if the game has none, after from_bytes or
+        with a word list, which is loaded as a DAWG for this game.
+        """
+        if self._cross_checks is None:
+            if not isinstance(self.words, Lexicon):
+                self.words = Lexicon.from_file(self.dict_file)
+            self._cross_checks = CrossChecks(self._board, self.words)
 
     def _place_move(self, tiles):
         """
@@ -510,35 +591,262 @@ class Scrabble:
         """
         self._move_count += 1
         for row, col, letter in tiles:
-            self._board[row][col] = letter
-
-    def _score_word(self, start, end, letters):
-        """
-        Adds the score of the valid word between start and end.
-        """
-        score = 0
-        multiplier = 1
-        for row in range(start[0], end[0] + 1):
-            for col in range(start[1], end[1] + 1):
-                if (row, col) in letters:
-                    # Check for score modifiers
-                    multiplier *= WORD_MULTIPLIERS.get((row, col), 1)
-                    score += LETTER_SCORE[letters[(row, col)]] * LETTER_MULTIPLIERS.get((row, col), 1)
-                else:
-                    # Tile must be on board, add it's value
-                    score += LETTER_SCORE[self._board[row][col]]
-
-        self._turn_score += score * multiplier
-
-
-    def _score_turn(self, tiles):
-        """
-        Applies the score of the last validated move to the player score.
-        """
-        self._player_score[self.current_player - 1] += self._turn_score
-        # Check for Bingo
-        if len(tiles) == 7:
-            self._player_score += 50
-        # Reset turn score counter
-        self._turn_score = 0
-        print("Score:", self._player_score)
+            self._board.place(row, col, letter)
+            self._hash ^= board_key(row, col, letter)
+        # The other players see the tiles for the first time
+        letters = [_rack_letter(letter) for _, _, letter in tiles]
+        for i, unseen in enumerate(self._unseen):
+            if i != self.current_player - 1:
+                unseen.see(letters)
+        if self._cross_checks is not None:
+            return self._cross_checks.update(tiles)
+        return None
+
+    def apply(self, move):
+        """
+        Plays a legal Move (e.g. from generate_moves) for the current player
+        without validating it, or passes if move is None. Returns an
+        UndoToken for undo(). Both cost time in the number of tiles placed.
+        """
+        # Cross-checks built between apply and undo would miss the undo
+        self._build_cross_checks()
+        player = self.current_player
+        rack = self.player_racks[player - 1]
+        if move is None:
+            token = UndoToken((), player, None, 0, None, 0, player, None, self._hash)
+        else:
+            tiles = move.tiles
+            hash_before = self._hash
+            drawn = min(len(tiles), len(self._bag))
+            token = UndoToken(tiles, player, rack[:], drawn,
+                              self._bag.getstate() if drawn else None, move.score,
+                              player, self._place_move(tiles), hash_before)
+            self._player_score[player - 1] += move.score
+            for _, _, letter in tiles:
+                self._remove_from_rack(player, _rack_letter(letter))
+            self._draw_tiles(len(tiles), player)
+        # advance_turn without logging, searches play many moves
+        self.current_player = (player % self.max_players) + 1
+        return token
+
+    def undo(self, token):
+        """Takes back the move of an UndoToken from apply(), the most recent first"""
+        self.current_player = token.current_player
+        if not token.tiles:
+            return
+        rack = self.player_racks[token.player - 1]
+        if token.drawn:
+            # Put back the drawn tiles so that the same draws come next
+            drawn = rack[len(rack) - token.drawn:]
+            self._bag.put_back(drawn)
+            self._bag.setstate(token.bag_state)
+            self._unseen[token.player - 1].unsee(drawn)
+        rack[:] = token.rack
+        self._hash = token.hash
+        self._player_score[token.player - 1] -= token.score
+        self._move_count -= 1
+        for row, col, _ in token.tiles:
+            self._board.remove(row, col)
+        letters = [_rack_letter(letter) for _, _, letter in token.tiles]
+        for i, unseen in enumerate(self._unseen):
+            if i != token.player - 1:
+                unseen.unsee(letters)
+        if token.cross_checks is not None:
+            self._cross_checks.restore(token.cross_checks)
+
+    def unseen(self, player=None):
+        """
+        The UnseenTiles of the player (the current player by default): the
+        bag and the other racks from their point of view, with the chances
+        of drawing a tile or of an opponent holding one.
+        """
+        return self._unseen[(player or self.current_player) - 1]
+
+    def position_hash(self):
+        """
+        64 bit Zobrist hash of the board, the racks and the player to move.
+        It is kept up to date as tiles are placed, drawn and exchanged.
+        """
+        return self._hash ^ turn_key(self.current_player)
+
+    def snapshot(self):
+        """A GameSnapshot of the board, racks, bag, scores and turn"""
+        return GameSnapshot(bytes(self._board.cells),
+                            tuple(tuple(rack) for rack in self.player_racks),
+                            self._bag.copy(), tuple(self._player_score), self._move_count,
+                            self.current_player)
+
+    def restore(self, snapshot):
+        """Returns the game to a GameSnapshot, rebuilding the cross-checks"""
+        self._set_state(snapshot.cells, snapshot.racks, snapshot.bag.copy(), snapshot.scores,
+                        snapshot.move_count, snapshot.current_player)
+        if self._cross_checks is not None:
+            self._cross_checks = CrossChecks(self._board, self.words)
+
+    def _set_state(self, cells, racks, bag, scores, move_count, current_player):
+        """Sets the board, racks, bag and scores, with the hash and unseen tiles they give"""
+        self._board = Board.from_cells(cells)
+        self.player_racks = [list(rack) for rack in racks]
+        self._bag = bag
+        self._player_score = list(scores)
+        self._move_count = move_count
+        self.current_player = current_player
+        self._hash = position_hash(cells, racks)
+        on_board = [_rack_letter(LETTERS[code]) for code in cells if code]
+        self._unseen = []
+        for rack in self.player_racks:
+            unseen = UnseenTiles()
+            unseen.see(on_board)
+            unseen.see(rack)
+            self._unseen.append(unseen)
+
+    def to_bytes(self):
+        """
+        The game in a compact binary form for from_bytes, little-endian:
+
+            header     magic, version, flags, players, current player, move count
+            board      225 letter codes, see Board
+            eliminated a byte per player
+            scores     an int32 per player
+            racks      for each player a length byte and the letter codes in rack order
+            bag        the count of each tile in TILES order
+            rng        625 uint32 of the bag's random state, unless the bag is empty
+        """
+        return _pack_game(self._board.cells, self.player_racks,
+                          [self._bag.count(tile) for tile in TILES],
+                          self._bag.getstate()[1] if len(self._bag) else None,
+                          self._player_score, self.eliminated, self._move_count,
+                          self.current_player)
+
+    @classmethod
+    def from_bytes(cls, data, dict_file='words.txt'):
+        """
+        The game saved by to_bytes, playing with dict_file (a word list or a
+        Lexicon, as for Scrabble). Nothing but the state is rebuilt, the
+        cross-checks are built on the first generate_moves or apply.
+        Loading takes microseconds with a shared Lexicon, a word list is
+        loaded again for each game, which takes milliseconds.
+        Raises ValueError if data is not a whole save with valid letter
+        codes and players, racks of at most RACK_SIZE tiles and no more
+        of a tile than the game has.
+        """
+        data = memoryview(data)
+        if len(data) < _SAVE_HEADER.size:
+            raise ValueError('Not a saved game')
+        magic, version, flags, players, current_player, move_count = \
+            _SAVE_HEADER.unpack_from(data)
+        if magic != _SAVE_MAGIC or version != SAVE_VERSION:
+            raise ValueError('Not a saved game')
+        if not 1 <= current_player <= players <= MAX_PLAYERS:
+            raise ValueError('Corrupt saved game')
+        try:
+            pos = _SAVE_HEADER.size
+            cells = bytes(data[pos:pos + SIZE * SIZE])
+            pos += SIZE * SIZE
+            eliminated = list(data[pos:pos + players])
+            pos += players
+            scores = struct.unpack_from(f'<{players}i', data, pos)
+            pos += 4 * players
+            racks = []
+            for _ in range(players):
+                length = data[pos]
+                if length > RACK_SIZE:
+                    raise ValueError('Rack too long')
+                codes = bytes(data[pos + 1:pos + 1 + length])
+                if codes.translate(None, _RACK_CODES):
+                    raise ValueError('Not a rack tile')
+                racks.append([LETTERS[code] for code in codes])
+                pos += 1 + length
+            # Seeded only to skip reading system randomness, the state follows
+            bag = TileBag(dict(zip(TILES, data[pos:pos + len(TILES)])), seed=0)
+            pos += len(TILES)
+            if flags & _SAVE_RNG:
+                words = array('I')
+                words.frombytes(data[pos:pos + 4 * _RNG_WORDS])
+                pos += 4 * _RNG_WORDS
+                bag.setstate((_RNG_VERSION, tuple(words), None))
+        except (AttributeError, IndexError, KeyError, OverflowError, TypeError, ValueError,
+                struct.error):
+            raise ValueError('Truncated or corrupt saved game') from None
+        if len(cells) != SIZE * SIZE or pos != len(data):
+            raise ValueError('Truncated or corrupt saved game')
+        # Bytes that are not letter codes are left over by the translate
+        if cells.translate(None, _BOARD_CODES):
+            raise ValueError('Corrupt saved game')
+        # The board, racks and bag hold at most the tiles of a game
+        tiles = Counter(bag.remaining())
+        tiles.update(_rack_letter(LETTERS[code]) for code in cells if code)
+        for rack in racks:
+            tiles.update(rack)
+        if any(count > LETTERS_FREQS[tile] for tile, count in tiles.items()):
+            raise ValueError('Corrupt saved game')
+
+        return cls.from_snapshot(GameSnapshot(cells, racks, bag, scores, move_count,
+                                              current_player), eliminated, dict_file)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, eliminated=None, dict_file='words.txt'):
+        """
+        A game in the state of a GameSnapshot, with no player eliminated by
+        default, playing with dict_file as for Scrabble. Unlike a new game
+        restored to the snapshot, no bag is dealt and the cross-checks are
+        built on the first generate_moves or apply.
+        """
+        game = cls.__new__(cls)
+        game.dict_file = dict_file
+        game._load_words()
+        game.max_players = len(snapshot.racks)
+        game.eliminated = list(eliminated) if eliminated else [0] * game.max_players
+        game._cross_checks = None
+        game._stats = None
+        game._set_state(snapshot.cells, snapshot.racks, snapshot.bag.copy(), snapshot.scores,
+                        snapshot.move_count, snapshot.current_player)
+        return game
+
+    def to_json(self):
+        """
+        The game as readable JSON for debugging, which from_json reads back:
+        board rows with '.' for an empty square, racks as strings and the
+        bag's random state as a list of numbers.
+        """
+        return json.dumps({
+            'version': SAVE_VERSION,
+            'board': [''.join(letter or '.' for letter in self._board.line(row))
+                      for row in range(SIZE)],
+            'racks': [''.join(rack) for rack in self.player_racks],
+            'bag': self._bag.remaining(),
+            'rng': list(self._bag.getstate()[1]) if len(self._bag) else None,
+            'scores': self._player_score,
+            'eliminated': self.eliminated,
+            'move_count': self._move_count,
+            'current_player': self.current_player,
+        })
+
+    @classmethod
+    def from_json(cls, text, dict_file='words.txt'):
+        """The game saved by to_json, see from_bytes"""
+        data = json.loads(text)
+        if not isinstance(data, dict) or data.get('version') != SAVE_VERSION:
+            raise ValueError('Not a saved game')
+        if not isinstance(data.get('bag'), dict):
+            raise ValueError('Truncated or corrupt saved game')
+        try:
+            cells = bytes(0 if letter == '.' else CODES[letter]
+                          for row in data['board'] for letter in row)
+            saved = _pack_game(cells, data['racks'],
+                               [data['bag'].get(tile, 0) for tile in TILES], data['rng'],
+                               data['scores'], data['eliminated'], data['move_count'],
+                               data['current_player'])
+        except (AttributeError, KeyError, OverflowError, TypeError, ValueError, struct.error):
+            raise ValueError('Truncated or corrupt saved game') from None
+        return cls.from_bytes(saved, dict_file)
+
+    def _score_turn(self, score):
+        """
+        Applies the score of a validated move to the player score.
+        """
+        self._player_score[self.current_player - 1] += score
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Score: %s", list(self._player_score),
+                        extra=event('score', player=self.current_player, points=score,
+                                    scores=list(self._player_score)))
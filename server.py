@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import functools
+import gc
+import itertools
+import json
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from board import SIZE
+from lexicon import load_lexicon
+from scrabble_rules import Scrabble
+from turn_stats import LATENCY_BUCKETS, Histogram, TurnStats, histogram_lines
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+# Longest request line accepted, in bytes
+MAX_MESSAGE = 4096
+# A client that lets this many bytes of replies and events pile up unread
+# is disconnected rather than buffered without end
+MAX_BUFFER = 1 << 20
+MAX_PLAYERS = 4
+# Collector thresholds while serving: young collections run less often, so
+# the full ones over thousands of games, which pause the loop for 100 ms,
+# come rarely
+GC_THRESHOLDS = (50000, 20, 100)
+
+
+class RequestError(Exception):
+    pass
+
+
+class Connection:
+    """A client: its stream and the games it follows, with its seat in each"""
+    def __init__(self, writer):
+        self.writer = writer
+        # game id -> the player the client plays as, None to only watch
+        self.games = {}
+
+    def send(self, message):
+        """Queues a message for the client without waiting for it to be sent"""
+        if self.writer.is_closing():
+            return
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            logger.warning("Dropping a client that is not reading")
+            self.writer.close()
+
+
+class HostedGame:
+    """A Scrabble game kept by the server with its seats and subscribers"""
+    def __init__(self, game_id, game):
+        self.id = game_id
+        self.game = game
+        # player -> Connection
+        self.seats = {}
+        self.subscribers = set()
+        # Moves of a game go to the executor one at a time
+        self.lock = asyncio.Lock()
+        self.over = False
+
+    def state(self, player=None):
+        """The public state of the game, with the rack of the player if given"""
+        game = self.game
+        state = {
+            'game': self.id,
+            'board': [''.join(letter or '.' for letter in game._board.line(row))
+                      for row in range(SIZE)],
+            'scores': game.get_scores(),
+            'rack_sizes': [len(rack) for rack in game.player_racks],
+            'bag': len(game._bag),
+            'current_player': game.current_player,
+            'seats': sorted(self.seats),
+            'over': self.over,
+        }
+        if player is not None:
+            state['player'] = player
+            state['rack'] = ''.join(game.get_rack(player))
+        return state
+
+    def broadcast(self, message):
+        """Sends an event to every subscriber"""
+        for connection in self.subscribers:
+            connection.send(message)
+
+
+class GameServer:
+    """
+    Hosts many Scrabble games in one process, all sharing one lexicon.
+
+    Clients connect over TCP and send one JSON object per line, each with
+    an "op", an optional "id" that is echoed back and the fields of the op:
+
+        new       players (2), seed, player      start a game and join it
+        join      game, player                   follow a game, playing as player if given
+        leave     game
+        state     game
+        move      game, tiles ([[row, col, letter], ...])
+        exchange  game, tiles ("letters")
+        pass      game
+        stats     format ("json" or "prometheus")
+
+    Every request gets a reply line with "ok" and either its result or an
+    "error". Subscribers of a game also get an "event" line for each move,
+    exchange or pass. Moves are validated with submit_turn on a thread of
+    the executor, one at a time per game, so a slow game never holds up
+    the event loop. A game is dropped once it has no subscribers left.
+    """
+    def __init__(self, lexicon, workers=1, stats=False):
+        self.lexicon = lexicon
+        self.games = {}
+        self.connections = set()
+        self._ids = itertools.count(1)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='scrabble')
+        # Turn phases of every game, see Scrabble.enable_stats
+        self.turn_stats = TurnStats() if stats else None
+        # Seconds from reading a move to replying
+        self.move_latency = Histogram(LATENCY_BUCKETS)
+        self._ops = {
+            'new': self.op_new,
+            'join': self.op_join,
+            'leave': self.op_leave,
+            'state': self.op_state,
+            'move': self.op_move,
+            'exchange': self.op_exchange,
+            'pass': self.op_pass,
+            'stats': self.op_stats,
+        }
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Starts listening and returns the asyncio Server"""
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_MESSAGE)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        """Serves one client until it disconnects"""
+        connection = Connection(writer)
+        self.connections.add(connection)
+        try:
+            while not writer.is_closing():
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    connection.send({'ok': False, 'error': "Message too long"})
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                connection.send(await self.dispatch(connection, line))
+        finally:
+            self.connections.discard(connection)
+            for game_id in list(connection.games):
+                self._leave(connection, game_id)
+            writer.close()
+
+    async def dispatch(self, connection, line):
+        """The reply to a request line"""
+        started = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("A request is a JSON object")
+        except ValueError:
+            return {'ok': False, 'error': "Not JSON"}
+        except RequestError as e:
+            return {'ok': False, 'error': str(e)}
+        reply = {'id': request.get('id')}
+        op = self._ops.get(request.get('op'))
+        try:
+            if op is None:
+                raise RequestError(f"Unknown op {request.get('op')!r}")
+            reply.update(await op(connection, request))
+            reply['ok'] = True
+        except RequestError as e:
+            reply.update(ok=False, error=str(e))
+        except (KeyError, TypeError, ValueError) as e:
+            reply.update(ok=False, error=f"Bad request: {e!r}")
+        if request.get('op') == 'move':
+            self.move_latency.observe(time.perf_counter() - started)
+        return reply
+
+    def _hosted(self, request):
+        hosted = self.games.get(request['game'])
+        if hosted is None:
+            raise RequestError(f"No game {request['game']!r}")
+        return hosted
+
+    def _seated(self, connection, request):
+        """The game of a request and the player to move, who the client must be"""
+        hosted = self._hosted(request)
+        if hosted.over:
+            raise RequestError("The game is over")
+        player = hosted.game.current_player
+        if hosted.seats.get(player) is not connection:
+            raise RequestError(f"It is Player {player}'s turn")
+        return hosted, player
+
+    def _leave(self, connection, game_id):
+        player = connection.games.pop(game_id)
+        hosted = self.games.get(game_id)
+        if hosted is None:
+            return
+        hosted.subscribers.discard(connection)
+        if player is not None:
+            del hosted.seats[player]
+        if not hosted.subscribers:
+            del self.games[game_id]
+
+    async def op_new(self, connection, request):
+        players = int(request.get('players', 2))
+        if not 2 <= players <= MAX_PLAYERS:
+            raise RequestError(f"Games have 2 to {MAX_PLAYERS} players")
+        game = await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(Scrabble, players, self.lexicon,
+                                             seed=request.get('seed'), first_player=1))
+        if self.turn_stats is not None:
+            game.enable_stats(self.turn_stats)
+        game_id = next(self._ids)
+        self.games[game_id] = HostedGame(game_id, game)
+        return await self.op_join(connection, {'game': game_id, 'player': request.get('player')})
+
+    async def op_join(self, connection, request):
+        hosted = self._hosted(request)
+        player = request.get('player')
+        # A move in progress would show half played
+        async with hosted.lock:
+            if player is not None:
+                player = int(player)
+                if not 1 <= player <= hosted.game.max_players:
+                    raise RequestError(f"No Player {player}")
+                if hosted.seats.get(player, connection) is not connection:
+                    raise RequestError(f"Player {player} is taken")
+                if connection.games.get(hosted.id) not in (None, player):
+                    raise RequestError("Already playing in this game")
+                hosted.seats[player] = connection
+            elif hosted.id in connection.games:
+                player = connection.games[hosted.id]
+            connection.games[hosted.id] = player
+            hosted.subscribers.add(connection)
+            return hosted.state(player)
+
+    async def op_leave(self, connection, request):
+        if request['game'] not in connection.games:
+            raise RequestError("Not in this game")
+        self._leave(connection, request['game'])
+        return {}
+
+    async def op_state(self, connection, request):
+        hosted = self._hosted(request)
+        async with hosted.lock:
+            return hosted.state(connection.games.get(hosted.id))
+
+    async def op_move(self, connection, request):
+        hosted, player = self._seated(connection, request)
+        tiles = [(int(row), int(col), str(letter)) for row, col, letter in request['tiles']]
+        loop = asyncio.get_running_loop()
+        async with hosted.lock:
+            game = hosted.game
+            if game.current_player != player:
+                raise RequestError(f"It is Player {game.current_player}'s turn")
+            result = await loop.run_in_executor(self.executor, game.submit_turn, tiles)
+            if not result:
+                return {'valid': False, 'reason': result.reason.name, 'words': result.words}
+            hosted.over = not game.get_rack(player) and not len(game._bag)
+            hosted.broadcast({'event': 'move', 'game': hosted.id, 'player': player,
+                              'tiles': tiles, 'score': result.score, 'scores': game.get_scores(),
+                              'bag': len(game._bag), 'current_player': game.current_player,
+                              'over': hosted.over})
+            return {'valid': True, 'score': result.score, 'rack': ''.join(game.get_rack(player))}
+
+    async def op_exchange(self, connection, request):
+        hosted, player = self._seated(connection, request)
+        old = list(request['tiles'])
+        async with hosted.lock:
+            game = hosted.game
+            if Counter(old) - Counter(game.get_rack(player)):
+                raise RequestError("Not all tiles are on the rack")
+            if not old or len(old) > len(game._bag):
+                raise RequestError("Not enough tiles in the bag")
+            game.exchange_tiles(old)
+            game.advance_turn()
+            hosted.broadcast({'event': 'exchange', 'game': hosted.id, 'player': player,
+                              'count': len(old), 'current_player': game.current_player})
+            return {'rack': ''.join(game.get_rack(player))}
+
+    async def op_pass(self, connection, request):
+        hosted, player = self._seated(connection, request)
+        async with hosted.lock:
+            hosted.game.advance_turn()
+            hosted.broadcast({'event': 'pass', 'game': hosted.id, 'player': player,
+                              'current_player': hosted.game.current_player})
+            return {}
+
+    async def op_stats(self, connection, request):
+        if request.get('format') == 'prometheus':
+            text = _gauge_lines(len(self.games), len(self.connections))
+            text += '\n'.join([f"# TYPE scrabble_move_latency_seconds histogram"] + histogram_lines(
+                'scrabble_move_latency_seconds', self.move_latency)) + '\n'
+            if self.turn_stats is not None:
+                text += self.turn_stats.prometheus()
+            return {'text': text}
+        return {
+            'games': len(self.games),
+            'connections': len(self.connections),
+            'move_latency': self.move_latency.snapshot(),
+            'turns': self.turn_stats.snapshot() if self.turn_stats is not None else None,
+        }
+
+
+def _gauge_lines(games, connections):
+    return (f"# TYPE scrabble_games gauge\nscrabble_games {games}\n"
+            f"# TYPE scrabble_connections gauge\nscrabble_connections {connections}\n")
+
+
+async def serve(host, port, dict_file='words.txt', workers=1, stats=False):
+    """Runs a GameServer until cancelled"""
+    server = GameServer(load_lexicon(dict_file), workers, stats)
+    # Everything loaded so far lives as long as the server
+    gc.freeze()
+    gc.set_threshold(*GC_THRESHOLDS)
+    listener = await server.start(host, port)
+    logger.info("Serving Scrabble on %s",
+                ', '.join(str(sock.getsockname()) for sock in listener.sockets))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrabble game server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-d', '--dict-file', default='words.txt')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='threads validating moves (default: 1)')
+    parser.add_argument('--stats', action='store_true', help='time the phases of every turn')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every game event')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if not args.verbose:
+        # Thousands of games would flood the log with their turns
+        logging.getLogger('scrabble_rules').setLevel(logging.WARNING)
+    try:
+        asyncio.run(serve(args.host, args.port, args.dict_file, args.workers, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
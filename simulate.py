@@ -0,0 +1,178 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from leaves import default_table, equity
+from lexicon import Lexicon, load_lexicon
+from scoring import RACK_SIZE
+from scrabble_rules import Scrabble
+
+# A game ends after this many turns in a row without a score
+MAX_SCORELESS_TURNS = 6
+
+
+def greedy(game, moves, rng):
+    """Plays the highest scoring move"""
+    return moves[0] if moves else None
+
+
+def random_move(game, moves, rng):
+    """Plays any legal move"""
+    return rng.choice(moves) if moves else None
+
+
+STRATEGIES = {
+    'greedy': greedy,
+    'random': random_move,
+    'equity': equity,
+}
+
+
+def load_strategy(name):
+    """A strategy by name, or a 'module:function' taking (game, moves, rng)"""
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, function = name.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def play_game(game_id, seed, strategies, lexicon):
+    """
+    Plays one game to the end and returns its record: final scores, every
+    turn and timings. The seed fixes both the bag and the strategies' choices.
+    """
+    started = time.perf_counter()
+    players = [load_strategy(name) for name in strategies]
+    rng = random.Random(seed * 2 + 1)
+    turns = []
+    move_seconds = 0.0
+
+    game = Scrabble(len(players), lexicon, seed=seed, first_player=1)
+    scoreless = 0
+    while scoreless < MAX_SCORELESS_TURNS:
+        player = game.current_player
+        generate_started = time.perf_counter()
+        moves = game.generate_moves()
+        move_seconds += time.perf_counter() - generate_started
+
+        move = players[player - 1](game, moves, rng)
+        rack = ''.join(game.get_rack(player))
+        bag = len(game._bag)
+        if move is not None and game.submit_turn(move.tiles):
+            turns.append({'player': player, 'word': move.word, 'tiles': move.tiles,
+                          'score': move.score, 'rack': rack, 'bag': bag})
+            scoreless = 0 if move.score else scoreless + 1
+            if not game.get_rack(player) and not len(game._bag):
+                break
+            continue
+
+        scoreless += 1
+        if len(game._bag) >= RACK_SIZE:
+            game.exchange_tiles(list(game.get_rack(player)))
+            turns.append({'player': player, 'exchange': True, 'score': 0})
+        else:
+            turns.append({'player': player, 'pass': True, 'score': 0})
+        game.advance_turn()
+
+    return {
+        'game': game_id,
+        'seed': seed,
+        'strategies': list(strategies),
+        'scores': game.get_scores(),
+        'racks': [''.join(rack) for rack in game.player_racks],
+        'turns': turns,
+        'seconds': time.perf_counter() - started,
+        'move_generation_seconds': move_seconds,
+    }
+
+
+_worker_lexicon = None
+
+
+def _init_worker(segment_name):
+    global _worker_lexicon
+    _worker_lexicon = Lexicon.attach(segment_name, shared_tracker=True)
+
+
+def _play_in_worker(game_id, seed, strategies):
+    return play_game(game_id, seed, strategies, _worker_lexicon)
+
+
+def simulate(games, strategies, dict_file='words.txt', seed=0, workers=None, output=None):
+    """
+    Plays the games over a pool of worker processes, game i uses seed + i.
+    The lexicon is loaded once into shared memory that the workers attach
+    to. Each record is written to output as a JSON line as soon as its game
+    finishes. Returns a summary with games per second, overall and per core.
+    """
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+    scores = [0] * len(strategies)
+    wins = [0] * len(strategies)
+    segment = load_lexicon(dict_file).share()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(segment.name,)) as pool:
+            futures = [pool.submit(_play_in_worker, i, seed + i, strategies) for i in range(games)]
+            for future in as_completed(futures):
+                record = future.result()
+                for i, score in enumerate(record['scores']):
+                    scores[i] += score
+                best = max(record['scores'])
+                if record['scores'].count(best) == 1:
+                    wins[record['scores'].index(best)] += 1
+                if output is not None:
+                    output.write(json.dumps(record) + '\n')
+                    output.flush()
+    finally:
+        segment.close()
+        segment.unlink()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'games': games,
+        'workers': workers,
+        'seconds': elapsed,
+        'games_per_second': games / elapsed,
+        'games_per_second_per_core': games / elapsed / workers,
+        'mean_scores': [score / games for score in scores] if games else scores,
+        'wins': wins,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless Scrabble self-play')
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-s', '--strategies', nargs='+', default=['greedy', 'greedy'],
+                        help="one per player: %s or module:function" % ', '.join(STRATEGIES))
+    parser.add_argument('-d', '--dict-file', default='words.txt')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('-o', '--output', help='file for per-game JSON lines (default: none)')
+    args = parser.parse_args(argv)
+    if 'equity' in args.strategies:
+        # Fail here rather than in every worker
+        try:
+            default_table()
+        except FileNotFoundError as e:
+            parser.error(str(e))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            summary = simulate(args.games, args.strategies, args.dict_file,
+                               args.seed, args.workers, output)
+    else:
+        summary = simulate(args.games, args.strategies, args.dict_file,
+                           args.seed, args.workers)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
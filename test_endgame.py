@@ -0,0 +1,81 @@
+import os
+import time
+import unittest
+
+from endgame import playout, rack_value, solve_endgame
+from lexicon import load_lexicon
+from scrabble_rules import Scrabble
+
+LEXICON = load_lexicon(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.txt'))
+
+
+def endgame(seed):
+    """A greedy game from the seed played until the bag is empty"""
+    game = Scrabble(2, LEXICON, seed=seed, first_player=1)
+    while len(game._bag):
+        moves = game.generate_moves()
+        game.apply(moves[0] if moves else None)
+    return game
+
+
+def spread(game):
+    """The score of the player to move less the other's"""
+    scores = game._player_score
+    return scores[game.current_player - 1] - scores[2 - game.current_player]
+
+
+def best_spread(game, passed=False):
+    """The spread the player to move gains with perfect play, by trying every line"""
+    rack = game.get_rack()
+    other_rack = game.get_rack(3 - game.current_player)
+    best = None
+    for move in game.generate_moves() + [None]:
+        token = game.apply(move)
+        if move is None:
+            if passed:
+                value = rack_value(other_rack) - rack_value(rack)
+            else:
+                value = -best_spread(game, True)
+        elif not rack:
+            value = move.score + 2 * rack_value(other_rack)
+        else:
+            value = move.score - best_spread(game)
+        game.undo(token)
+        if best is None or value > best:
+            best = value
+    return best
+
+
+class SolveEndgameTest(unittest.TestCase):
+    def setUp(self):
+        self.game = endgame(3)
+
+    def test_small_endgames_are_solved_exactly(self):
+        snapshot = self.game.snapshot()
+        for racks in ((('b', 'd'), ('u',)), (('b',), ('u', 'g'))):
+            self.game.restore(snapshot._replace(racks=racks))
+            before = self.game.snapshot()
+            result = solve_endgame(self.game, time_limit=10)
+            self.assertTrue(result.complete)
+            self.assertEqual(result.spread, spread(self.game) + best_spread(self.game))
+            self.assertEqual(result.spread, spread(self.game) + playout(self.game, result.moves))
+            self.assertEqual(self.game.snapshot(), before)
+
+    def test_search_deepens_within_the_time_limit(self):
+        # 4 tiles against 7, too many for a complete search in the time
+        position = self.game.position_hash()
+        started = time.perf_counter()
+        result = solve_endgame(self.game, time_limit=2)
+        self.assertLess(time.perf_counter() - started, 3)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertFalse(result.complete)
+        self.assertEqual(result.spread, spread(self.game) + playout(self.game, result.moves))
+        self.assertEqual(self.game.position_hash(), position)
+
+    def test_bag_must_be_empty(self):
+        with self.assertRaises(ValueError):
+            solve_endgame(Scrabble(2, LEXICON, seed=0), time_limit=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import io
+import json
+import logging
+import unittest
+
+from game_log import JsonLinesHandler, event, log_to_json_lines
+from lexicon import load_lexicon
+from scrabble_rules import Scrabble
+
+
+class JsonLinesHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger('test_game_log')
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.handlers.clear()
+        self.logger.setLevel(logging.NOTSET)
+
+    def lines(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_events_are_written_in_batches(self):
+        handler = log_to_json_lines(self.stream, logger='test_game_log', batch_size=2)
+        self.logger.info("Score: %s", [3, 0], extra=event('score', player=1, points=3))
+        self.assertEqual(self.stream.getvalue(), '')
+        self.logger.info("It's now Player %d's turn.", 2, extra=event('turn', player=2))
+        first, second = self.lines()
+        self.assertEqual(first['event'], 'score')
+        self.assertEqual(first['message'], "Score: [3, 0]")
+        self.assertEqual((first['player'], first['points']), (1, 3))
+        self.assertEqual((second['event'], second['player']), ('turn', 2))
+        self.logger.warning("Plain message")
+        handler.close()
+        self.assertEqual(self.lines()[2]['event'], None)
+        self.assertEqual(self.lines()[2]['level'], 'WARNING')
+
+    def test_disabled_level_writes_nothing(self):
+        handler = JsonLinesHandler(self.stream)
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.WARNING)
+        self.logger.info("Not written", extra=event('turn', player=1))
+        handler.close()
+        self.assertEqual(self.stream.getvalue(), '')
+
+
+class GameEventsTest(unittest.TestCase):
+    def test_batched_messages_keep_the_scores_of_their_turn(self):
+        stream = io.StringIO()
+        game_logger = logging.getLogger('scrabble_rules')
+        level = game_logger.level
+        handler = log_to_json_lines(stream, logger='scrabble_rules', batch_size=100)
+        try:
+            game = Scrabble(2, load_lexicon('words.txt'), seed=0, first_player=1)
+            for _ in range(3):
+                moves = game.generate_moves()
+                game.submit_turn(moves[0].tiles)
+        finally:
+            handler.close()
+        # Closing the sink puts the logger back as it was
+        self.assertNotIn(handler, game_logger.handlers)
+        self.assertEqual(game_logger.level, level)
+        scores = [json.loads(line) for line in stream.getvalue().splitlines()]
+        scores = [record for record in scores if record['event'] == 'score']
+        self.assertEqual(len(scores), 3)
+        self.assertEqual(len({tuple(record['scores']) for record in scores}), 3)
+        for record in scores:
+            self.assertEqual(record['message'], f"Score: {record['scores']}")
+
+
+if __name__ == '__main__':
+    unittest.main()
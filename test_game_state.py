@@ -0,0 +1,38 @@
+import unittest
+
+from game_state import GameState
+from lexicon import load_lexicon
+from scrabble_rules import Scrabble
+
+LEXICON = load_lexicon('words.txt')
+
+
+class GameStateTest(unittest.TestCase):
+    def test_round_trip(self):
+        game = Scrabble(3, LEXICON, seed=4, first_player=1)
+        for _ in range(6):
+            game.submit_turn(game.generate_moves()[0].tiles)
+        game.remove_player(2)
+        state = GameState.from_game(game)
+        loaded = state.to_game(LEXICON)
+        # Racks come back in tile order
+        self.assertEqual(loaded.snapshot(), state.snapshot())
+        self.assertEqual([sorted(rack) for rack in loaded.player_racks],
+                         [sorted(rack) for rack in game.player_racks])
+        self.assertEqual(GameState.from_game(loaded), state)
+        self.assertEqual(loaded.position_hash(), game.position_hash())
+        self.assertEqual(loaded.eliminated, game.eliminated)
+        self.assertEqual([loaded._bag.draw() for _ in range(10)],
+                         [game._bag.draw() for _ in range(10)])
+
+    def test_loaded_game_plays_on(self):
+        game = Scrabble(2, LEXICON, seed=5, first_player=1)
+        game.submit_turn(game.generate_moves()[0].tiles)
+        loaded = GameState.from_game(game).to_game(LEXICON)
+        move = loaded.generate_moves()[0]
+        self.assertEqual(game.evaluate_move(move.tiles).score, move.score)
+        self.assertTrue(loaded.submit_turn(move.tiles))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from array import array
+
+from constants import LETTERS_FREQS
+from leaves import (_BIG_ENDIAN, _LEAVES_HEADER, LeaveTable, _solve, fit, leave_key, leave_of,
+                    samples)
+
+BAG = [tile for tile, count in LETTERS_FREQS.items() for _ in range(count)]
+
+
+def small_table():
+    """A table valuing three leaves"""
+    values = {leave_key('s'): 8.0, leave_key('q'): -7.0, leave_key('ers'): 12.5}
+    keys = sorted(values)
+    return LeaveTable(array('I', keys), array('f', [values[key] for key in keys]))
+
+
+class LeaveKeyTest(unittest.TestCase):
+    def test_key_ignores_order(self):
+        self.assertEqual(leave_key('ers'), leave_key('sre'))
+        self.assertEqual(leave_key(['e', ' ', 'e']), leave_key('ee '))
+        self.assertNotEqual(leave_key('ee'), leave_key('e'))
+
+    def test_leave_of_takes_blanks_for_upper_case_letters(self):
+        tiles = [(7, 7, 'c'), (7, 8, 'A'), (7, 9, 't')]
+        self.assertEqual(sorted(leave_of('act e s', tiles)), [' ', 'a', 'e', 's'])
+        with self.assertRaises(ValueError):
+            leave_of('act', [(7, 7, 'X')])
+
+
+class SamplesTest(unittest.TestCase):
+    def test_leaves_are_paired_with_the_next_score(self):
+        record = {'turns': [
+            {'player': 1, 'tiles': [[7, 7, 'c'], [7, 8, 'A'], [7, 9, 't']], 'rack': 'act er ',
+             'bag': 80, 'score': 10},
+            {'player': 2, 'pass': True, 'score': 0},
+            # Too few tiles in the bag to refill, so no sample
+            {'player': 1, 'tiles': [[8, 7, 'e']], 'rack': 'erabcde', 'bag': 0, 'score': 14},
+            {'player': 1, 'exchange': True, 'score': 0},
+        ]}
+        found = [(sorted(leave), points) for leave, points in samples([record])]
+        self.assertEqual(found, [([' ', 'a', 'e', 'r'], 14)])
+
+
+class FitTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A fresh rack scores 20, keeping an S is worth 8 more, a Q 7 less
+        rng = random.Random(0)
+        samples = []
+        for _ in range(2000):
+            leave = rng.sample(BAG, rng.randrange(7))
+            samples.append((leave, 20 + 8 * min(leave.count('s'), 1) - 7 * leave.count('q')))
+        cls.table = fit(samples)
+
+    def test_recovers_tile_values(self):
+        self.assertAlmostEqual(self.table['s'], 8, delta=0.2)
+        self.assertAlmostEqual(self.table['q'], -7, delta=0.2)
+        self.assertAlmostEqual(self.table['qs'], 1, delta=0.3)
+        self.assertAlmostEqual(self.table['e'], 0, delta=0.2)
+        # A second S adds nothing
+        self.assertAlmostEqual(self.table['ss'], 8, delta=0.2)
+
+    def test_solve(self):
+        self.assertEqual(_solve([[4.0, 2.0], [2.0, 3.0]], [8.0, 8.0]), [1.0, 2.0])
+
+    def test_every_leave_has_a_value(self):
+        # Leaves never sampled are valued from their tiles
+        self.assertAlmostEqual(self.table['qsvwx'], 1, delta=0.5)
+        # A whole rack is not a leave
+        self.assertEqual(self.table['aeinrst'], 0.0)
+
+
+class LeaveTableTest(unittest.TestCase):
+    def test_missing_leave_is_worth_nothing(self):
+        table = small_table()
+        self.assertEqual(table['z'], 0.0)
+        self.assertEqual(table[''], 0.0)
+        self.assertEqual(table['rse'], 12.5)
+        self.assertEqual(table.value('qers', [(7, 7, 'q')]), 12.5)
+
+    def test_save_and_load(self):
+        handle, path = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+        try:
+            small_table().save(path)
+            table = LeaveTable.load(path)
+            self.assertEqual(len(table), 3)
+            self.assertEqual((table['s'], table['q'], table['ers']), (8.0, -7.0, 12.5))
+            self.assertEqual(table['a'], 0.0)
+            del table
+        finally:
+            os.remove(path)
+
+    def test_other_byte_order_is_swapped(self):
+        data = small_table().to_bytes()
+        magic, version, flags, count = _LEAVES_HEADER.unpack_from(data)
+        start = _LEAVES_HEADER.size
+        keys = array('I', data[start:start + 4 * count])
+        values = array('f', data[start + 4 * count:])
+        keys.byteswap()
+        values.byteswap()
+        swapped = (_LEAVES_HEADER.pack(magic, version, flags ^ _BIG_ENDIAN, count)
+                   + keys.tobytes() + values.tobytes())
+        table = LeaveTable.from_buffer(swapped)
+        self.assertEqual((table['s'], table['q'], table['ers']), (8.0, -7.0, 12.5))
+        self.assertEqual(bool(flags & _BIG_ENDIAN), sys.byteorder == 'big')
+
+    def test_bad_images_are_refused(self):
+        data = small_table().to_bytes()
+        for bad in (data[:4], b'X' + data[1:], data[:-1]):
+            with self.assertRaises(ValueError):
+                LeaveTable.from_buffer(bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
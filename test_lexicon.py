@@ -0,0 +1,66 @@
+import unittest
+
+import lexicon
+from lexicon import Lexicon
+
+WORDS = ['AA', 'AB', 'ABA', 'BAA', 'CAB', 'CABS', 'SCAB']
+
+
+class SharedLexiconTest(unittest.TestCase):
+    def test_attach_reads_the_shared_image(self):
+        segment = Lexicon(WORDS).share()
+        try:
+            shared = Lexicon.attach(segment.name, shared_tracker=True)
+            self.assertEqual(list(shared), WORDS)
+            self.assertIn('cabs', shared)
+            self.assertNotIn('cas', shared)
+            del shared
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def test_children_cache_is_bounded(self):
+        words = Lexicon(WORDS)
+        size = lexicon.CHILDREN_CACHE_SIZE
+        lexicon.CHILDREN_CACHE_SIZE = 2
+        try:
+            found = list(words.query('*'))
+            self.assertLessEqual(len(words._children), 2)
+        finally:
+            lexicon.CHILDREN_CACHE_SIZE = size
+        self.assertEqual(found, WORDS)
+
+
+class QueryTest(unittest.TestCase):
+    def setUp(self):
+        self.words = Lexicon(WORDS)
+
+    def query(self, pattern, **lengths):
+        return list(self.words.query(pattern, **lengths))
+
+    def test_wildcards(self):
+        self.assertEqual(self.query('?A'), ['AA'])
+        self.assertEqual(self.query('??'), ['AA', 'AB'])
+        self.assertEqual(self.query('ca?'), ['CAB'])
+        self.assertEqual(self.query('A*'), ['AA', 'AB', 'ABA'])
+        # A star may match nothing
+        self.assertEqual(self.query('*AB'), ['AB', 'CAB', 'SCAB'])
+
+    def test_letter_sets(self):
+        self.assertEqual(self.query('[ABC]A?'), ['BAA', 'CAB'])
+        self.assertEqual(self.query('[^ABC]*'), ['SCAB'])
+
+    def test_lengths(self):
+        self.assertEqual(self.query('*', min_length=3, max_length=3), ['ABA', 'BAA', 'CAB'])
+        self.assertEqual(self.query('*', min_length=4), ['CABS', 'SCAB'])
+        self.assertEqual(self.query(['AB', '*'], max_length=2), ['AA', 'AB'])
+
+    def test_sequences(self):
+        self.assertEqual(self.query([{'A', 'B'}, 'A', None]), ['BAA'])
+        # A 26 bit mask, bit 2 being C
+        self.assertEqual(self.query([1 << 2, None, None]), ['CAB'])
+        self.assertEqual(self.query([1 << 2, '*']), ['CAB', 'CABS'])
+
+
+if __name__ == '__main__':
+    unittest.main()
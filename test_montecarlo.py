@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import unittest
+from array import array
+
+from leaves import LeaveTable, leave_key, leave_of
+from lexicon import load_lexicon
+from montecarlo import RolloutPool, simulate_candidates
+from scrabble_rules import Scrabble
+
+LEXICON = load_lexicon('words.txt')
+
+
+class SimulateCandidatesTest(unittest.TestCase):
+    def setUp(self):
+        self.game = Scrabble(2, LEXICON, seed=3, first_player=1)
+        self.candidates = self.game.generate_moves()[:4]
+        rack = self.game.get_rack()
+        # Each candidate's leave is worth 10 points per tile kept
+        leaves = {leave_key(leave_of(rack, move.tiles)): 10.0 * (7 - len(move.tiles))
+                  for move in self.candidates}
+        keys = sorted(leaves)
+        table = LeaveTable(array('I', keys), array('f', [leaves[key] for key in keys]))
+        handle, self.leaves_file = tempfile.mkstemp(suffix='.bin')
+        os.close(handle)
+        table.save(self.leaves_file)
+
+    def tearDown(self):
+        os.remove(self.leaves_file)
+
+    def test_one_ply_equity_is_score_plus_leave(self):
+        for workers in (1, 2):
+            evaluations = simulate_candidates(self.game, self.candidates, iterations=3, plies=1,
+                                              workers=workers, seed=0,
+                                              leaves_file=self.leaves_file)
+            for evaluation in evaluations:
+                move = evaluation.move
+                self.assertEqual(evaluation.equity, move.score + 10.0 * (7 - len(move.tiles)))
+            self.assertEqual({evaluation.rollouts for evaluation in evaluations}, {3})
+
+    def test_a_pool_is_reused_across_calls(self):
+        with RolloutPool(LEXICON, 2) as pool:
+            for seed in range(2):
+                evaluations = simulate_candidates(self.game, self.candidates, iterations=4,
+                                                  plies=1, seed=seed, pool=pool,
+                                                  leaves_file=self.leaves_file)
+                self.assertEqual({evaluation.rollouts for evaluation in evaluations}, {4})
+
+    def test_time_budget_stops_mid_sample(self):
+        game = Scrabble(2, LEXICON, seed=1, first_player=1)
+        for _ in range(4):
+            game.apply(game.generate_moves()[0])
+        before = game.snapshot()
+        candidates = game.generate_moves()[:20]
+        started = time.perf_counter()
+        evaluations = simulate_candidates(game, candidates, iterations=1000, time_budget=0.3,
+                                          plies=4, workers=1, seed=0, leaves_file=None)
+        self.assertLess(time.perf_counter() - started, 0.45)
+        # Samples cut short are dropped, so every candidate has as many
+        self.assertEqual(len({evaluation.rollouts for evaluation in evaluations}), 1)
+        self.assertEqual(game.snapshot(), before)
+
+    def test_without_leaves_equity_is_the_spread(self):
+        evaluations = simulate_candidates(self.game, self.candidates, iterations=2, plies=1,
+                                          workers=1, seed=0, leaves_file=None)
+        for evaluation in evaluations:
+            self.assertEqual(evaluation.equity, evaluation.move.score)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from rack_index import RackIndex
+
+WORDS = ['AA', 'AB', 'ABETS', 'ABS', 'BA', 'BAS', 'BASTE', 'BEAST', 'BEATS', 'CAB', 'CABS',
+         'SCAB', 'TAB', 'TABS']
+
+
+class RackIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = RackIndex(WORDS)
+
+    def test_anagrams(self):
+        self.assertEqual(sorted(self.index.anagrams('tseab')), ['ABETS', 'BASTE', 'BEAST', 'BEATS'])
+        self.assertEqual(self.index.anagrams('xyz'), [])
+
+    def test_words_without_blanks(self):
+        self.assertEqual(sorted(self.index.words('abs')), ['AB', 'ABS', 'BA', 'BAS'])
+        self.assertEqual(sorted(self.index.words('abs', 2)), ['AB', 'BA'])
+        self.assertEqual(sorted(self.index.bingos('abest')), ['ABETS', 'BASTE', 'BEAST', 'BEATS'])
+        self.assertEqual(self.index.bingos('abc'), ['CAB'])
+        self.assertEqual(self.index.bingos('abz'), [])
+
+    def test_words_with_one_blank(self):
+        self.assertEqual(sorted(self.index.words('ab ')),
+                         ['AA', 'AB', 'ABS', 'BA', 'BAS', 'CAB', 'TAB'])
+        self.assertEqual(sorted(self.index.bingos('ab ')), ['ABS', 'BAS', 'CAB', 'TAB'])
+        self.assertEqual(sorted(self.index.bingos('best ')), ['ABETS', 'BASTE', 'BEAST', 'BEATS'])
+
+    def test_words_with_two_blanks(self):
+        self.assertEqual(sorted(self.index.bingos('ab  ')), ['CABS', 'SCAB', 'TABS'])
+        self.assertEqual(sorted(self.index.words('  ', 2)), ['AA', 'AB', 'BA'])
+        self.assertEqual(sorted(self.index.bingos('bt   ')), ['ABETS', 'BASTE', 'BEAST', 'BEATS'])
+
+    def test_words_with_a_board_letter(self):
+        self.assertEqual(self.index.words_with('ab', 'c', 3), ['CAB'])
+        self.assertEqual(sorted(self.index.words_with('bs ', 'a', 4)), ['CABS', 'SCAB', 'TABS'])
+        self.assertEqual(sorted(self.index.words_with(' ', 'a', 2)), ['AA', 'AB', 'BA'])
+        # The board letter has to be used
+        self.assertEqual(self.index.words_with('ab ', 'z', 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from lexicon import load_lexicon
+from scoring import score_moves
+from scrabble_rules import Scrabble, evaluate_move
+
+LEXICON = load_lexicon('words.txt')
+
+
+class ScoreMovesTest(unittest.TestCase):
+    def test_batch_matches_generated_and_evaluated_scores(self):
+        for seed in range(3):
+            game = Scrabble(2, LEXICON, seed=seed, first_player=1)
+            for _ in range(6):
+                moves = game.generate_moves()
+                cells = bytes(game._board.cells)
+                scores = score_moves(game._board, [move.tiles for move in moves])
+                self.assertEqual(bytes(game._board.cells), cells)
+                self.assertEqual(scores, [move.score for move in moves])
+                for move, score in zip(moves, scores):
+                    result = evaluate_move(game._board, game.get_rack(), move.tiles, game.words)
+                    self.assertEqual(result.score, score, move)
+                game.apply(moves[0] if moves else None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import json
+import random
+import unittest
+from collections import Counter
+
+from constants import LETTERS_FREQS
+from lexicon import load_lexicon
+from scrabble_rules import _SAVE_HEADER, Rejection, Scrabble, evaluate_move
+
+LEXICON = load_lexicon('words.txt')
+
+
+def play_greedy(game, moves):
+    """Plays the best generated move, or passes, for the given number of turns"""
+    for _ in range(moves):
+        generated = game.generate_moves()
+        game.apply(generated[0] if generated else None)
+
+
+def all_tiles(game):
+    """Counts of the tiles in the bag, on the racks and on the board"""
+    tiles = Counter(game._bag)
+    for rack in game.player_racks:
+        tiles.update(rack)
+    for code in game._board.cells:
+        if code:
+            # Played blanks are their letter in upper case
+            tiles[' ' if code & 32 else chr(code + 96)] += 1
+    return tiles
+
+
+class GenerateMovesTest(unittest.TestCase):
+    def test_moves_are_valid_with_their_score(self):
+        for seed in range(3):
+            game = Scrabble(2, LEXICON, seed=seed, first_player=1)
+            for _ in range(6):
+                moves = game.generate_moves()
+                for move in moves:
+                    result = evaluate_move(game._board, game.get_rack(), move.tiles, game.words)
+                    self.assertTrue(result.valid, (move, result.reason))
+                    self.assertEqual(result.score, move.score, move)
+                game.apply(moves[0] if moves else None)
+
+
+class SubmitTurnTest(unittest.TestCase):
+    def test_rejected_move_says_why(self):
+        game = Scrabble(2, LEXICON, seed=0, first_player=1)
+        result = game.submit_turn([(0, 0, game.get_rack()[0])])
+        self.assertFalse(result)
+        self.assertEqual(result.reason, Rejection.NOT_ON_STAR)
+        self.assertEqual(game.current_player, 1)
+
+    def test_played_move_returns_its_score(self):
+        game = Scrabble(2, LEXICON, seed=0, first_player=1)
+        move = game.generate_moves()[0]
+        result = game.submit_turn(move.tiles)
+        self.assertTrue(result)
+        self.assertEqual(result.score, move.score)
+        self.assertEqual(game.get_scores()[0], move.score)
+
+
+class ApplyUndoTest(unittest.TestCase):
+    def test_undo_restores_the_game(self):
+        game = Scrabble(2, LEXICON, seed=1, first_player=1)
+        play_greedy(game, 4)
+        before = game.snapshot()
+        position = game.position_hash()
+        unseen = [Counter(game.unseen(player)) for player in (1, 2)]
+        moves = game.generate_moves()
+        tokens = []
+        for _ in range(3):
+            generated = game.generate_moves()
+            tokens.append(game.apply(generated[0] if generated else None))
+        self.assertNotEqual(game.snapshot(), before)
+        for token in reversed(tokens):
+            game.undo(token)
+        self.assertEqual(game.snapshot(), before)
+        self.assertEqual(game.position_hash(), position)
+        self.assertEqual([Counter(game.unseen(player)) for player in (1, 2)], unseen)
+        self.assertEqual(game.generate_moves(), moves)
+
+
+class ExchangeTest(unittest.TestCase):
+    def test_exchange_keeps_every_tile(self):
+        for seed in range(10):
+            game = Scrabble(2, LEXICON, seed=seed, first_player=1)
+            game.exchange_tiles(game.get_rack()[:4])
+            game.exchange_tiles(game.get_rack())
+            self.assertEqual(all_tiles(game), Counter(LETTERS_FREQS))
+            self.assertEqual(Counter(game.unseen(1)), Counter(game._bag) + Counter(game.get_rack(2)))
+
+    def test_tiles_not_on_the_rack_are_refused(self):
+        game = Scrabble(2, LEXICON, seed=0, first_player=1)
+        rack = list(game.get_rack())
+        missing = next(tile for tile in 'abcdefghijklmnopqrstuvwxyz' if tile not in rack)
+        game.exchange_tiles([missing])
+        self.assertEqual(game.get_rack(), rack)
+        self.assertEqual(all_tiles(game), Counter(LETTERS_FREQS))
+
+
+class SaveTest(unittest.TestCase):
+    def setUp(self):
+        self.game = Scrabble(3, LEXICON, seed=2, first_player=1)
+        play_greedy(self.game, 9)
+
+    def assertSameGame(self, loaded):
+        self.assertEqual(loaded.snapshot(), self.game.snapshot())
+        self.assertEqual(loaded.position_hash(), self.game.position_hash())
+        self.assertEqual(loaded.eliminated, self.game.eliminated)
+        self.assertEqual(loaded.generate_moves(), self.game.generate_moves())
+
+    def test_bytes_round_trip(self):
+        self.assertSameGame(Scrabble.from_bytes(self.game.to_bytes(), LEXICON))
+
+    def test_json_round_trip(self):
+        self.assertSameGame(Scrabble.from_json(self.game.to_json(), LEXICON))
+
+    def test_corrupt_bytes_are_refused(self):
+        data = self.game.to_bytes()
+        # The first board square is just after the header
+        board = _SAVE_HEADER.size
+        for corrupt in (data[:-1], data + b'\0', b'X' + data[1:],
+                        data[:board] + b'\xc8' + data[board + 1:]):
+            with self.assertRaises(ValueError):
+                Scrabble.from_bytes(corrupt, LEXICON)
+
+    def test_more_tiles_than_the_game_has_are_refused(self):
+        data = self.game.to_bytes()
+        # The one 'z' is already out, another on an empty square makes two
+        square = _SAVE_HEADER.size + self.game._board.cells.index(0)
+        with self.assertRaises(ValueError):
+            Scrabble.from_bytes(data[:square] + b'\x1a' + data[square + 1:], LEXICON)
+        saved = json.loads(self.game.to_json())
+        saved['bag']['q'] = 2
+        with self.assertRaises(ValueError):
+            Scrabble.from_json(json.dumps(saved), LEXICON)
+
+    def test_long_racks_are_refused(self):
+        saved = json.loads(self.game.to_json())
+        saved['racks'][0] = 'aaaaaaaa'
+        saved['bag'].pop('a', None)
+        with self.assertRaises(ValueError):
+            Scrabble.from_json(json.dumps(saved), LEXICON)
+
+    def test_loaded_corruptions_leave_no_negative_counts(self):
+        data = self.game.to_bytes()
+        rng = random.Random(0)
+        for _ in range(300):
+            pos = rng.randrange(len(data))
+            corrupt = data[:pos] + bytes([rng.randrange(256)]) + data[pos + 1:]
+            try:
+                loaded = Scrabble.from_bytes(corrupt, LEXICON)
+            except ValueError:
+                continue
+            for player in (1, 2, 3):
+                unseen = loaded.unseen(player)
+                self.assertTrue(all(unseen.count(tile) >= 0 for tile in LETTERS_FREQS), pos)
+
+    def test_malformed_json_is_refused(self):
+        saved = json.loads(self.game.to_json())
+        huge_rng = dict(saved, rng=[2 ** 32] * len(saved['rng']))
+        for text in ('[]', '"game"', json.dumps(dict(saved, bag=[])),
+                     json.dumps(dict(saved, bag='abc')), json.dumps(dict(saved, racks=[1, 2, 3])),
+                     json.dumps(dict(saved, scores=['a'] * 3)), json.dumps(huge_rng)):
+            with self.assertRaises(ValueError):
+                Scrabble.from_json(text, LEXICON)
+
+    def test_unknown_letters_are_refused(self):
+        text = self.game.to_json().replace('.', '#', 1)
+        with self.assertRaises(ValueError):
+            Scrabble.from_json(text, LEXICON)
+
+
+if __name__ == '__main__':
+    unittest.main()
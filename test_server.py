@@ -0,0 +1,130 @@
+import asyncio
+import json
+import unittest
+
+from lexicon import load_lexicon
+from scrabble_rules import Scrabble
+from server import GameServer
+
+LEXICON = load_lexicon('words.txt')
+
+
+class Client:
+    """A connection to the server that keeps the events it is sent"""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.events = []
+        self._ids = 0
+
+    async def request(self, op, **fields):
+        """Sends a request and returns its reply, keeping events read on the way"""
+        self._ids += 1
+        self.writer.write(json.dumps(dict(fields, op=op, id=self._ids)).encode() + b'\n')
+        await self.writer.drain()
+        while True:
+            message = await self.next_message()
+            if 'event' in message:
+                self.events.append(message)
+            elif message['id'] == self._ids:
+                return message
+
+    async def next_event(self):
+        if self.events:
+            return self.events.pop(0)
+        return await self.next_message()
+
+    async def next_message(self):
+        line = await asyncio.wait_for(self.reader.readline(), 5)
+        return json.loads(line)
+
+
+class GameServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = GameServer(LEXICON, stats=True)
+        self.listener = await self.server.start(port=0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+        self.clients = []
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            client.writer.close()
+            await client.writer.wait_closed()
+        # Let the server see the clients go before the loop closes
+        while self.server.connections:
+            await asyncio.sleep(0.01)
+        self.listener.close()
+        await self.listener.wait_closed()
+        self.server.close()
+
+    async def connect(self):
+        client = Client(*await asyncio.open_connection('127.0.0.1', self.port))
+        self.clients.append(client)
+        return client
+
+    async def test_two_players(self):
+        first, second = await self.connect(), await self.connect()
+        created = await first.request('new', players=2, seed=0, player=1)
+        self.assertTrue(created['ok'])
+        game_id = created['game']
+        # The server deals the same racks as a game with the same seed
+        local = Scrabble(2, LEXICON, seed=0, first_player=1)
+        self.assertEqual(created['rack'], ''.join(local.get_rack(1)))
+        joined = await second.request('join', game=game_id, player=2)
+        self.assertEqual((joined['ok'], joined['player'], joined['seats']), (True, 2, [1, 2]))
+        taken = await second.request('join', game=game_id, player=1)
+        self.assertEqual(taken['error'], "Player 1 is taken")
+
+        early = await second.request('move', game=game_id, tiles=[[7, 7, 'a']])
+        self.assertEqual(early['error'], "It is Player 1's turn")
+        rejected = await first.request('move', game=game_id,
+                                       tiles=[[0, 0, local.get_rack(1)[0]]])
+        self.assertEqual((rejected['ok'], rejected['valid'], rejected['reason']),
+                         (True, False, 'NOT_ON_STAR'))
+
+        move = local.generate_moves()[0]
+        played = await first.request('move', game=game_id, tiles=[list(tile) for tile in move.tiles])
+        self.assertEqual((played['valid'], played['score']), (True, move.score))
+        event = await second.next_event()
+        self.assertEqual((event['event'], event['player'], event['score'], event['current_player']),
+                         ('move', 1, move.score, 2))
+        self.assertEqual(event['scores'], [move.score, 0])
+        self.assertEqual((await first.next_event())['event'], 'move')
+
+        rack = joined['rack']
+        exchanged = await second.request('exchange', game=game_id, tiles=rack[:3])
+        self.assertTrue(exchanged['ok'])
+        self.assertEqual(len(exchanged['rack']), len(rack))
+        event = await first.next_event()
+        self.assertEqual((event['event'], event['count'], event['current_player']),
+                         ('exchange', 3, 1))
+        self.assertEqual((await second.next_event())['event'], 'exchange')
+        missing = await first.request('exchange', game=game_id, tiles='qqq')
+        self.assertEqual(missing['error'], "Not all tiles are on the rack")
+
+        self.assertTrue((await first.request('pass', game=game_id))['ok'])
+        event = await second.next_event()
+        self.assertEqual((event['event'], event['player'], event['current_player']),
+                         ('pass', 1, 2))
+        out_of_turn = await first.request('pass', game=game_id)
+        self.assertEqual(out_of_turn['error'], "It is Player 2's turn")
+
+        stats = await first.request('stats')
+        self.assertEqual((stats['games'], stats['connections']), (1, 2))
+        self.assertEqual(stats['turns']['counters']['turns'], 2)
+        self.assertEqual(stats['turns']['counters']['accepted'], 1)
+        self.assertEqual(stats['move_latency']['count'], 3)
+        text = (await first.request('stats', format='prometheus'))['text']
+        self.assertIn('scrabble_games 1', text.splitlines())
+        self.assertIn('scrabble_rejections_total{reason="NOT_ON_STAR"} 1', text.splitlines())
+
+    async def test_bad_requests_get_errors(self):
+        client = await self.connect()
+        self.assertEqual((await client.request('deal'))['error'], "Unknown op 'deal'")
+        self.assertEqual((await client.request('state', game=9))['error'], "No game 9")
+        client.writer.write(b'not json\n')
+        self.assertEqual(await client.next_message(), {'ok': False, 'error': "Not JSON"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import threading
+import time
+import unittest
+
+from turn_stats import Histogram, TimedWords, TurnStats
+
+
+class SlowWords:
+    """A dictionary whose lookups take 10 ms"""
+    def __contains__(self, word):
+        time.sleep(0.01)
+        return word == 'CAB'
+
+
+class HistogramTest(unittest.TestCase):
+    def test_buckets_and_quantiles(self):
+        histogram = Histogram((1, 2, 5))
+        for value in (0.5, 1, 2, 3, 9):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(1, 2), (2, 3), (5, 4), (float('inf'), 5)])
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertEqual(histogram.quantile(0.99), float('inf'))
+        self.assertIsNone(Histogram((1,)).quantile(0.5))
+
+
+class TurnStatsTest(unittest.TestCase):
+    def test_prometheus(self):
+        stats = TurnStats()
+        stats.record_turn(0.002, 3)
+        stats.record_turn(0.001, 0, 'NOT_COLINEAR')
+        lines = stats.prometheus().splitlines()
+        self.assertIn('scrabble_turns_total 2', lines)
+        self.assertIn('scrabble_rejected_total 1', lines)
+        self.assertIn('scrabble_rejections_total{reason="NOT_COLINEAR"} 1', lines)
+        self.assertIn('scrabble_phase_seconds_bucket{phase="total",le="0.001"} 1', lines)
+        self.assertIn('scrabble_phase_seconds_count{phase="total"} 2', lines)
+        self.assertIn('scrabble_lookups_per_turn_bucket{le="+Inf"} 2', lines)
+        self.assertIn('scrabble_lookups_per_turn_sum 3', lines)
+
+    def test_threads_sharing_stats_lose_no_updates(self):
+        stats = TurnStats()
+
+        def turns():
+            for _ in range(5000):
+                stats.record_turn(0.001, 2)
+                stats.observe('place', 0.001)
+
+        threads = [threading.Thread(target=turns) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['counters']['turns'], 20000)
+        self.assertEqual(snapshot['counters']['dictionary_lookups'], 40000)
+        self.assertEqual(snapshot['latency']['place']['count'], 20000)
+        self.assertEqual(snapshot['lookups_per_turn']['count'], 20000)
+
+    def test_lookups_are_left_out_of_their_phase_only(self):
+        stats = TurnStats()
+        turn = TimedWords(SlowWords(), stats)
+        other_turn = TimedWords(SlowWords(), stats)
+        self.assertTrue(turn.time('touches_others', turn.__contains__, 'CAB'))
+        # Lookups of another turn sharing the stats are not this turn's
+        self.assertFalse(turn.time('scoring', other_turn.__contains__, 'CAT'))
+        self.assertLess(stats.latency['touches_others'].sum, 0.005)
+        self.assertGreaterEqual(stats.latency['scoring'].sum, 0.01)
+        self.assertEqual(stats.latency['dictionary'].count, 2)
+        self.assertEqual((turn.lookups, other_turn.lookups), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
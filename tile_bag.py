@@ -0,0 +1,95 @@
+import random
+
+from constants import LETTERS_FREQS
+
+# Tiles in count order: 'a' to 'z', then ' ' for the blank
+TILES = list(LETTERS_FREQS)
+_INDEX = {tile: i for i, tile in enumerate(TILES)}
+
+
+class TileBag:
+    """
+    The bag as a count of each tile with its own random generator.
+
+    A draw picks a tile with probability proportional to its count, which
+    is the same as taking one from a shuffled bag, so tiles can be put back
+    without reshuffling and a copy is a list of 27 counts. Draws depend only
+    on the seed and the calls made, never on the global random state.
+    """
+    def __init__(self, counts=None, seed=None):
+        """A full bag, or one holding counts ({tile: count}), drawn with the seed"""
+        if counts is None:
+            counts = LETTERS_FREQS
+        self._counts = [counts.get(tile, 0) for tile in TILES]
+        self._total = sum(self._counts)
+        self._rng = random.Random(seed)
+
+    def copy(self):
+        """An independent bag with the same tiles that draws the same sequence"""
+        bag = TileBag.__new__(TileBag)
+        bag._counts = self._counts[:]
+        bag._total = self._total
+        bag._rng = random.Random()
+        bag._rng.setstate(self._rng.getstate())
+        return bag
+
+    def __eq__(self, other):
+        """Bags are equal when they hold the same tiles and will draw alike"""
+        if not isinstance(other, TileBag):
+            return NotImplemented
+        return self._counts == other._counts and self.getstate() == other.getstate()
+
+    def __len__(self):
+        return self._total
+
+    def __contains__(self, tile):
+        return tile in _INDEX and self._counts[_INDEX[tile]] > 0
+
+    def __iter__(self):
+        """Every tile left, in tile order"""
+        for tile, count in zip(TILES, self._counts):
+            for _ in range(count):
+                yield tile
+
+    def count(self, tile):
+        """Number of copies of the tile left"""
+        return self._counts[_INDEX[tile]]
+
+    def remaining(self):
+        """{tile: count} of the tiles left"""
+        return {tile: count for tile, count in zip(TILES, self._counts) if count}
+
+    def draw(self):
+        """Takes a random tile out of the bag, None if it is empty"""
+        if not self._total:
+            return None
+        # A walk over the 27 counts, so constant time whatever is left
+        pick = self._rng.randrange(self._total)
+        for i, count in enumerate(self._counts):
+            if pick < count:
+                self._counts[i] -= 1
+                self._total -= 1
+                return TILES[i]
+            pick -= count
+
+    def remove(self, tile):
+        """Takes a given tile out of the bag"""
+        i = _INDEX[tile]
+        if not self._counts[i]:
+            raise ValueError(f"No {tile!r} left in the bag")
+        self._counts[i] -= 1
+        self._total -= 1
+
+    def put_back(self, tiles):
+        """Returns tiles to the bag"""
+        for tile in tiles:
+            self._counts[_INDEX[tile]] += 1
+            self._total += 1
+
+    def getstate(self):
+        """The state of the bag's random generator"""
+        return self._rng.getstate()
+
+    def setstate(self, state):
+        """Restores a state from getstate"""
+        self._rng.setstate(state)
@@ -0,0 +1,117 @@
+import random
+from array import array
+from collections import namedtuple
+
+from board import CODES, SIZE
+from constants import LETTERS_FREQS
+
+# Zobrist keys: a position's hash is the XOR of the keys of every tile on
+# the board, every tile on a rack and the player to move. Fixed seed, so
+# hashes are the same in every process.
+MAX_PLAYERS = 8
+_MAX_COPIES = max(LETTERS_FREQS.values())
+_random = random.Random(0x5C7AB81E)
+# BOARD_KEYS[square * 64 + code], 0 for an empty square
+BOARD_KEYS = array('Q', bytes(8 * SIZE * SIZE * 64))
+for _square in range(SIZE * SIZE):
+    for _code in range(1, 64):
+        BOARD_KEYS[_square * 64 + _code] = _random.getrandbits(64)
+# A rack is hashed by counts: the kth copy of a tile has its own key, so
+# the order of the rack does not matter
+RACK_KEYS = array('Q', [_random.getrandbits(64) for _ in range(MAX_PLAYERS * 28 * _MAX_COPIES)])
+TURN_KEYS = array('Q', [_random.getrandbits(64) for _ in range(MAX_PLAYERS)])
+
+
+def board_key(row, col, letter):
+    """Key of a letter (lower case, or upper case for a blank) on a square"""
+    return BOARD_KEYS[(row * SIZE + col) * 64 + CODES[letter]]
+
+
+def rack_key(player, tile, copy):
+    """Key of the copy-th (from 0) tile of a kind on the player's rack"""
+    return RACK_KEYS[((player - 1) * 28 + CODES[tile]) * _MAX_COPIES + copy]
+
+
+def turn_key(player):
+    """Key of the player to move"""
+    return TURN_KEYS[player - 1]
+
+
+def position_hash(cells, racks):
+    """Hash of board codes and racks from scratch, without the player to move"""
+    value = 0
+    for square, code in enumerate(cells):
+        if code:
+            value ^= BOARD_KEYS[square * 64 + code]
+    for player, rack in enumerate(racks, 1):
+        copies = {}
+        for tile in rack:
+            copy = copies.get(tile, 0)
+            copies[tile] = copy + 1
+            value ^= rack_key(player, tile, copy)
+    return value
+
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# A stored search result: the value, how deep it was searched, whether the
+# value is exact or a lower or upper bound, and the best move found
+Entry = namedtuple('Entry', ['value', 'depth', 'flag', 'move'])
+
+
+class TranspositionTable:
+    """
+    Search results of positions keyed by their 64 bit hash, in a fixed
+    number of slots allocated up front.
+
+    Each hash maps to a pair of slots. The first keeps the deepest result
+    seen and the second always takes the newest, so a deep result is not
+    lost to shallow ones and recent positions still find a place.
+    """
+    def __init__(self, size=1 << 20):
+        """Allocate size slots, rounded up to a power of two"""
+        slots = 2
+        while slots < size:
+            slots *= 2
+        self._mask = slots // 2 - 1
+        self._keys = array('Q', bytes(8 * slots))
+        self._depths = array('b', [-1]) * slots
+        self._flags = array('b', bytes(slots))
+        self._values = array('i', bytes(4 * slots))
+        self._moves = [None] * slots
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Number of slots in use"""
+        return len(self._depths) - self._depths.count(-1)
+
+    def get(self, key):
+        """The Entry stored for the hash, or None"""
+        slot = (key & self._mask) * 2
+        for slot in (slot, slot + 1):
+            if self._depths[slot] >= 0 and self._keys[slot] == key:
+                self.hits += 1
+                return Entry(self._values[slot], self._depths[slot],
+                             self._flags[slot], self._moves[slot])
+        self.misses += 1
+        return None
+
+    def put(self, key, value, depth, flag=EXACT, move=None):
+        """Stores a search result for the hash"""
+        slot = (key & self._mask) * 2
+        if self._keys[slot] != key and depth < self._depths[slot]:
+            slot += 1
+        self._keys[slot] = key
+        self._depths[slot] = min(depth, 127)
+        self._flags[slot] = flag
+        self._values[slot] = value
+        self._moves[slot] = move
+
+    def clear(self):
+        """Empties every slot"""
+        self._depths = array('b', [-1]) * len(self._depths)
+        self._moves = [None] * len(self._moves)
+        self.hits = 0
+        self.misses = 0
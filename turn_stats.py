@@ -0,0 +1,187 @@
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+# The phases of Scrabble.submit_turn that are timed, 'total' being the whole turn
+PHASES = ('rack_check', 'colinear', 'unique', 'empty', 'contiguous', 'touches_others',
+          'dictionary', 'scoring', 'place', 'refill', 'total')
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 0.1)
+# Upper bounds of the buckets of dictionary lookups per turn
+LOOKUP_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15)
+
+
+class Histogram:
+    """Counts of observed values falling at or under each bound, Prometheus style"""
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        # The last bucket holds values over every bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(bound, count of values at or under it) pairs, ending with infinity"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """
+        The bound of the bucket holding the q quantile (0 to 1), so an upper
+        estimate of it. None before any observation.
+        """
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+
+    def snapshot(self):
+        """The histogram as a dict that can be saved as JSON"""
+        return {
+            'buckets': [[bound, total] for bound, total in self.cumulative()[:-1]],
+            'sum': self.sum,
+            'count': self.count,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+
+class TurnStats:
+    """
+    Counters and latency histograms of Scrabble.submit_turn, filled in
+    while a game has them enabled with Scrabble.enable_stats. One can be
+    shared by many games to add up their turns.
+
+    counters counts turns, accepted and rejected moves and dictionary
+    lookups, rejections counts rejected moves by Rejection name, latency
+    has a Histogram of seconds for each of PHASES and lookups one of the
+    dictionary lookups made per turn. Time spent in dictionary lookups
+    counts under 'dictionary' only, not under the phase that made them, see
+    TimedWords. Updates and exports hold a lock, so games on several
+    threads can share one.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Starts counting again from zero"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.counters = {'turns': 0, 'accepted': 0, 'rejected': 0, 'dictionary_lookups': 0}
+        self.rejections = {}
+        self.latency = {phase: Histogram(LATENCY_BUCKETS) for phase in PHASES}
+        self.lookups = Histogram(LOOKUP_BUCKETS)
+
+    def time(self, phase, function, *args):
+        """Calls function with args, adding the time it took to the phase"""
+        started = perf_counter()
+        result = function(*args)
+        self.observe(phase, perf_counter() - started)
+        return result
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            self.latency[phase].observe(seconds)
+
+    def record_turn(self, seconds, lookups, rejection=None):
+        """Counts a turn that took seconds and made lookups, rejection naming why it failed"""
+        with self._lock:
+            self.counters['turns'] += 1
+            self.counters['dictionary_lookups'] += lookups
+            self.lookups.observe(lookups)
+            self.latency['total'].observe(seconds)
+            if rejection is None:
+                self.counters['accepted'] += 1
+            else:
+                self.counters['rejected'] += 1
+                self.rejections[rejection] = self.rejections.get(rejection, 0) + 1
+
+    def snapshot(self):
+        """The counters and histograms as a dict that can be saved as JSON"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'rejections': dict(self.rejections),
+                'latency': {phase: histogram.snapshot()
+                            for phase, histogram in self.latency.items()},
+                'lookups_per_turn': self.lookups.snapshot(),
+            }
+
+    def prometheus(self, prefix='scrabble'):
+        """The counters and histograms in the Prometheus text exposition format"""
+        with self._lock:
+            return self._prometheus(prefix)
+
+    def _prometheus(self, prefix):
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_rejections_total counter")
+        for reason, value in sorted(self.rejections.items()):
+            lines.append(f'{prefix}_rejections_total{{reason="{reason}"}} {value}')
+        lines.append(f"# TYPE {prefix}_phase_seconds histogram")
+        for phase, histogram in self.latency.items():
+            lines.extend(histogram_lines(f"{prefix}_phase_seconds", histogram,
+                                         f'phase="{phase}",'))
+        lines.append(f"# TYPE {prefix}_lookups_per_turn histogram")
+        lines.extend(histogram_lines(f"{prefix}_lookups_per_turn", self.lookups))
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(name, histogram, labels=''):
+    """The Prometheus text lines of a Histogram, labels being 'name="value",' pairs"""
+    lines = []
+    for bound, total in histogram.cumulative():
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{{{labels}le="{le}"}} {total}')
+    labels = '{' + labels.rstrip(',') + '}' if labels else ''
+    lines.append(f"{name}_sum{labels} {histogram.sum}")
+    lines.append(f"{name}_count{labels} {histogram.count}")
+    return lines
+
+
+class TimedWords:
+    """
+    A dictionary for one turn that times its lookups into the 'dictionary'
+    phase of a TurnStats and counts them. Its time() times the other phases
+    of the turn without those lookups, which is right even when the
+    TurnStats is shared by games on other threads.
+    """
+    def __init__(self, words, stats):
+        self._words = words
+        self._stats = stats
+        self.lookups = 0
+        # Seconds of the lookups so far
+        self.seconds = 0.0
+
+    def __contains__(self, word):
+        started = perf_counter()
+        found = word in self._words
+        elapsed = perf_counter() - started
+        self._stats.observe('dictionary', elapsed)
+        self.seconds += elapsed
+        self.lookups += 1
+        return found
+
+    def time(self, phase, function, *args):
+        """As TurnStats.time, leaving out the lookups made through this dictionary"""
+        started = perf_counter()
+        looking_up = self.seconds
+        result = function(*args)
+        self._stats.observe(phase, perf_counter() - started - (self.seconds - looking_up))
+        return result
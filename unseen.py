@@ -0,0 +1,99 @@
+from array import array
+
+from constants import LETTERS_FREQS, LETTER_SCORE
+from scoring import RACK_SIZE
+from tile_bag import TILES
+
+_INDEX = {tile: i for i, tile in enumerate(TILES)}
+_VALUES = [LETTER_SCORE.get(tile, 0) for tile in TILES]
+MAX_TILES = sum(LETTERS_FREQS.values())
+MAX_DRAW = RACK_SIZE
+_WIDTH = MAX_TILES + 1
+
+# Hypergeometric miss probabilities: _MISS[(N * _WIDTH + K) * (MAX_DRAW + 1) + n]
+# is the chance that n tiles taken from N, K of them of interest, include
+# none of the K
+_MISS = array('d')
+for _total in range(_WIDTH):
+    for _wanted in range(_WIDTH):
+        _chance = 1.0
+        for _drawn in range(MAX_DRAW + 1):
+            _MISS.append(_chance if _wanted <= _total and _drawn <= _total else 0.0)
+            if _drawn < _total:
+                _chance *= max(_total - _wanted - _drawn, 0) / (_total - _drawn)
+
+
+def miss_probability(total, wanted, drawn):
+    """
+    Chance that drawn tiles out of total include none of wanted ones, for
+    up to MAX_DRAW tiles drawn.
+    """
+    drawn = min(drawn, total)
+    if not 0 <= drawn <= MAX_DRAW:
+        raise ValueError(f"Chances are kept for draws of up to {MAX_DRAW} tiles")
+    return _MISS[(total * _WIDTH + wanted) * (MAX_DRAW + 1) + drawn]
+
+
+class UnseenTiles:
+    """
+    The tiles one player has not seen: the full distribution less the
+    tiles on the board and on their own rack. The bag and the other racks
+    are a random split of these, so the chances below hold for either.
+
+    Scrabble keeps one per player up to date as tiles are drawn, placed
+    and exchanged. Tiles are rack letters, ' ' for a blank.
+    """
+    def __init__(self, counts=None):
+        """The unseen tiles at the start of a game, or counts ({tile: count})"""
+        if counts is None:
+            counts = LETTERS_FREQS
+        self._counts = [counts.get(tile, 0) for tile in TILES]
+        self._total = sum(self._counts)
+
+    def __len__(self):
+        return self._total
+
+    def __iter__(self):
+        """Every unseen tile, in tile order"""
+        for tile, count in zip(TILES, self._counts):
+            for _ in range(count):
+                yield tile
+
+    def count(self, tile):
+        """Number of unseen copies of the tile"""
+        return self._counts[_INDEX[tile]]
+
+    def remaining(self):
+        """{tile: count} of the unseen tiles"""
+        return {tile: count for tile, count in zip(TILES, self._counts) if count}
+
+    def see(self, tiles):
+        """Tiles that came into view, drawn by the player or placed by another"""
+        for tile in tiles:
+            self._counts[_INDEX[tile]] -= 1
+        self._total -= len(tiles)
+
+    def unsee(self, tiles):
+        """Tiles that went out of view, returned to the bag or taken back"""
+        for tile in tiles:
+            self._counts[_INDEX[tile]] += 1
+        self._total += len(tiles)
+
+    def draw_probability(self, tile, draws=1):
+        """Chance that draws tiles from the bag include at least one of the tile"""
+        return 1.0 - miss_probability(self._total, self._counts[_INDEX[tile]], draws)
+
+    def holds_probability(self, tiles=('s', ' '), rack_size=RACK_SIZE):
+        """
+        Chance that an opponent's rack of rack_size tiles holds at least one
+        of the tiles, by default an S or a blank.
+        """
+        wanted = sum(self._counts[_INDEX[tile]] for tile in set(tiles))
+        return 1.0 - miss_probability(self._total, wanted, rack_size)
+
+    def expected_draw_value(self, draws=1):
+        """Expected sum of the tile values of draws tiles from the bag"""
+        if not self._total:
+            return 0.0
+        value = sum(count * tile_value for count, tile_value in zip(self._counts, _VALUES))
+        return min(draws, self._total) * value / self._total